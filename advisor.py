@@ -0,0 +1,104 @@
+import time
+
+from clients import get_fetcher, get_google_search, get_llm_router, get_response_cache
+from context_builder import DEFAULT_CONTEXT_TOKENS, build_context
+from fetcher import DEFAULT_DEADLINE, DEFAULT_MIN_PAGES
+from llm import CachedPrompt, collapse_blank_lines, stream_message
+from metrics import metrics
+
+##############################
+# مستشارك التسويقي: البحث في جوجل + جلب الصفحات + نموذج اللغة
+##############################
+
+# مثال توضيحي للاعتماد عليه في بناء النموذج
+EXAMPLE_CONTENT = """
+    🌟 تمر العجوة الفاخر - مذاق الأجداد بنكهة حديثة
+
+    **الوصف:**
+    تمتع بمذاق تمر العجوة الفاخر، المقطوف بعناية من مزارع المدينة المنورة. يتميز بنكهته الغنية وقيمته الغذائية العالية.
+
+    **المميزات التنافسية:**
+    - طبيعي 100% بدون إضافات
+    - حاصل على شهادة الجودة السعودية
+    - طعم فريد وقوام ناعم
+    - شحن سريع لجميع مناطق المملكة
+
+    **الجمهور المستهدف:**
+    - محبي التمور الفاخرة
+    - المهتمون بالتغذية الصحية
+    - الباحثون عن هدايا فاخرة
+
+    **اقتراحات للحملات التسويقية:**
+    1. **حملات موسمية:** عروض شهر رمضان
+    2. **حملات رقمية:** فيديوهات عن فوائد التمر
+    **شعار الحملة:** تمر العجوة – تراث أصيل، مذاق فريد
+    """
+
+# الجزء الثابت من الطلب (المثال والتعليمات) يأتي أولًا كبادئة واحدة لا تتغير بين الطلبات
+# حتى يخزنها المزود (prompt caching) ولا يعالجها من جديد، ويليها المحتوى المتغير
+ADVISOR_PREFIX = f"""
+    اعتمد على المثال التالي لإنشاء محتوى تسويقي مشابه للمنتج التالي، 
+    مع دراسة المحتوى المقدم واستنتاج استراتيجيات التسويق منه:
+
+    **مثال:**
+    {EXAMPLE_CONTENT}
+
+    **المطلوب:**
+    - تحليل المحتوى المقدم واستخراج الاستراتيجيات التسويقية منه.
+    - إنشاء محتوى تسويقي يشمل:
+      - وصف جذاب للمنتج.
+      - فوائد تنافسية.
+      - الجمهور المستهدف.
+      - اقتراحات للحملات التسويقية.
+      - شعار مناسب.
+
+    يرجى التأكد من أن المحتوى يظهر بوضوح وبشكل منظم مع استخدام العناوين والقوائم.
+    """
+
+
+@metrics.timed("advisor_total")
+def run_marketing_advisor(job, product_name, product_description):
+    """مهمة خلفية: البحث وجلب الصفحات وتوليد النصائح، مع تحديث المرحلة والنص الجزئي"""
+    search_query = product_description
+
+    job.stage = "🔍  اقرأ لك السوق الآن ..."
+    with metrics.timer("advisor_search"):
+        search_results = get_google_search().results(search_query, num_results=10)
+
+    # جلب الروابط من نتائج البحث
+    urls = [result.get('link', '') for result in search_results]
+
+    job.stage = "📄 أحلل لك استراتجيات السوق.."
+    # جلب الروابط بالتوازي عبر الجلسة المشتركة
+    with metrics.timer("advisor_fetch"):
+        page_contents = fetch_all_content(urls)
+
+    prompt_started = time.perf_counter()
+    # اختيار أكثر الفقرات صلة بالمنتج ضمن ميزانية التوكنات
+    formatted_content = build_context(
+        page_contents, f"{product_name} {product_description}",
+        token_budget=DEFAULT_CONTEXT_TOKENS
+    ) or "لم يتوفر محتوى من الإنترنت."
+
+    marketing_prompt = CachedPrompt(ADVISOR_PREFIX, f"""
+    **المحتوى المستخرج من الإنترنت:**
+    {formatted_content}
+    """)
+
+    metrics.observe("stage_seconds", time.perf_counter() - prompt_started, stage="advisor_prompt")
+
+    job.stage = "📝 جاري توليد المحتوى ..."
+    # تحسين تنسيق النص أثناء التدفق
+    with metrics.timer("advisor_llm"):
+        for chunk in collapse_blank_lines(stream_message(
+            get_llm_router(), marketing_prompt, max_tokens=1024, cache=get_response_cache()
+        )):
+            job.partial += chunk
+
+    return job.partial or "تعذر جلب الاستجابة من نموذج اللغة.", search_results
+
+
+def fetch_all_content(urls, min_pages=DEFAULT_MIN_PAGES, deadline=DEFAULT_DEADLINE):
+    """جلب الصفحات حتى يكفي عددها أو تنتهي المهلة، مع استبعاد الصفحات الفاشلة"""
+    pages = get_fetcher().fetch_all(urls, min_pages=min_pages, deadline=deadline)
+    return [page.text for page in pages]
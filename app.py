@@ -1,34 +1,20 @@
 import os
+import time
+import uuid
 import streamlit as st
-import openai
-import requests
-import anthropic
-from gtts import gTTS
-from io import BytesIO
 
-from dotenv import load_dotenv
+from advisor import run_marketing_advisor
+from clients import ADMIN_TOKEN, get_job_executor, start_metrics_server
+from generation import (
+    CONTENT_TYPES, LOGO_STYLES, generate_logo_prompt, run_logo_generation, run_model_text,
+    run_recommendation, run_voiceover
+)
+from jobs import JobQueueFull
+from metrics import metrics
 
-import asyncio
-import aiohttp
-from bs4 import BeautifulSoup
-from langchain_community.utilities import GoogleSearchAPIWrapper
+JOB_POLL_INTERVAL = 0.5  # الفاصل بين فحوصات اكتمال المهام الخلفية بالثواني
 
-##############################
-# تهيئة المفاتيح والـ API
-##############################
-load_dotenv()  # تحميل المتغيرات من ملف .env
-
-OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
-ANTHROPIC_API_KEY = os.getenv("ANTHROPIC_API_KEY")
-GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
-GOOGLE_CSE_ID = os.getenv("GOOGLE_CSE_ID")
-
-openai.api_key = OPENAI_API_KEY
-anthropic_client = anthropic.Anthropic(api_key=ANTHROPIC_API_KEY)
-google_search = GoogleSearchAPIWrapper(
-    google_api_key=GOOGLE_API_KEY,
-    google_cse_id=GOOGLE_CSE_ID
-)
+start_metrics_server()
 
 ##############################
 # إعداد واجهة الصفحة الافتراضية
@@ -76,6 +62,63 @@ st.markdown(
 if "page" not in st.session_state:
     st.session_state.page = "home"
 
+##############################
+# المهام الخلفية للجلسة
+# العمل البطيء يُرسل إلى منفذ مشترك حتى لا تضيع نتيجته عند إعادة تشغيل السكربت
+##############################
+def session_id():
+    if "session_id" not in st.session_state:
+        st.session_state.session_id = uuid.uuid4().hex
+    return st.session_state.session_id
+
+def submit_job(key, fn, *args):
+    """إرسال مهمة خلفية وحفظ رقمها في حالة الجلسة تحت key"""
+    try:
+        st.session_state[key] = get_job_executor().submit(session_id(), fn, *args)
+    except JobQueueFull as e:
+        st.warning(f"⏳ الخدمة مشغولة حاليًا، حاول بعد قليل. ({e})")
+
+def session_job(key):
+    """المهمة المحفوظة تحت key لهذه الجلسة، أو None"""
+    job_id = st.session_state.get(key)
+    if job_id is None:
+        return None
+    job = get_job_executor().get(job_id)
+    if job is None:
+        del st.session_state[key]
+    return job
+
+def rerun_while_running(*jobs):
+    """إعادة تشغيل الصفحة دوريًا ما دامت إحدى المهام لم تنتهِ"""
+    if any(job is not None and not job.done for job in jobs):
+        time.sleep(JOB_POLL_INTERVAL)
+        st.rerun()
+
+def voiceover_section(key, text):
+    """
+    زر التعليق الصوتي للنص المولد: يُعرض أول مقطع فور جاهزيته للاستماع
+    أثناء توليد الباقي، ثم الصوت كاملًا مع زر التحميل. مشغل الصوت الكامل يبدأ
+    من أوله (لا يحتفظ st.audio بموضع التشغيل عند استبدال المقطع). تُرجع مهمة الصوت.
+    """
+    if st.button("🔊 استمع للنص", key=f"{key}_button"):
+        submit_job(key, run_voiceover, text)
+        st.session_state[f"{key}_text"] = text
+    job = session_job(key)
+    if job is None or st.session_state.get(f"{key}_text") != text:
+        return None  # لا صوت بعد، أو الصوت لنص سابق
+    if job.error is not None:
+        st.error(f"تعذر توليد التعليق الصوتي. ({job.error})")
+    elif not job.done:
+        if job.partial:
+            st.audio(job.partial[0], format="audio/mp3")
+            st.caption(f"⏳ جاري تجهيز بقية التعليق الصوتي ... ({len(job.partial)} مقطع جاهز)")
+        else:
+            st.info("⏳ جاري تجهيز التعليق الصوتي ...")
+    elif job.result:
+        st.audio(job.result, format="audio/mp3")
+        st.download_button("تحميل التعليق الصوتي", job.result, file_name="sawq.mp3", mime="audio/mpeg")
+    return job
+
 ##################################################################
 # الصفحة الأولى: الصفحة الرئيسية (Home) مع عرض الشعار والأزرار
 ##################################################################
@@ -111,7 +154,7 @@ def brand_design_page():
     product_name = st.text_input("أدخل اسم المنتج أو العلامة التجارية:")
     style_choice = st.radio(
         "اختر نوع الشعار:",
-        options=["شعار نصي", "شعار حرفي", "شعار رمزي", "شخصية", "لا شيء"],
+        options=LOGO_STYLES,
         horizontal=True
     )
     description = st.text_area("أدخل وصفًا إضافيًا للشعار:")
@@ -119,65 +162,23 @@ def brand_design_page():
     if st.button("توليد الشعار"):
         if product_name and style_choice != "لا شيء":
             prompt = generate_logo_prompt(product_name, style_choice, description)
-            file_path = generate_image(prompt)
-            if file_path:
-                st.image(file_path, caption="الشعار المولد باستخدام DALL-E")
-                st.success(f"تم حفظ الشعار في المسار: {file_path}")
-            else:
-                st.error("حدث خطأ أثناء توليد الشعار. حاول مرة أخرى.")
+            submit_job("logo_job", run_logo_generation, prompt)
         else:
             st.warning("يرجى إدخال اسم المنتج واختيار نوع الشعار.")
 
-def generate_logo_prompt(product_name, style_choice, description):
-    """إنشاء نص لطلب تصميم الشعار"""
-    if style_choice == "شعار نصي":
-        return (
-            f"Design a clean and elegant text-based logo for the brand '{product_name}'. "
-            f"The logo should focus on text with a sleek and readable style. {description if description else ''}"
-        )
-    elif style_choice == "شعار حرفي":
-        return (
-            f"Create a professional logo using the initials of the brand name '{product_name}'. "
-            f"The design should reflect the identity of the brand. {description if description else ''}"
-        )
-    elif style_choice == "شعار رمزي":
-        return (
-            f"Design a unique symbolic logo for the brand '{product_name}'. "
-            f"Use icons or symbols that represent the concept of the brand effectively. {description if description else ''}"
-        )
-    elif style_choice == "شخصية":
-        return (
-            f"Create a character-based logo representing the brand '{product_name}'. "
-            f"The character should be unique and visually aligned with the brand's identity. {description if description else ''}"
-        )
-    else:
-        return (
-            f"Design an innovative logo for the product or brand named '{product_name}'. {description if description else ''}"
-        )
-
-def generate_image(prompt):
-    """توليد صورة باستخدام DALL-E"""
-    try:
-        response = openai.Image.create(
-            prompt=prompt,
-            n=1,
-            size="512x512"
-        )
-        image_url = response['data'][0]['url']
-
-        image_response = requests.get(image_url)
-        if image_response.status_code == 200:
-            os.makedirs("images", exist_ok=True)
-            file_path = os.path.join("images", "generated_logo.png")
-            with open(file_path, "wb") as file:
-                file.write(image_response.content)
-            return file_path
+    logo_job = session_job("logo_job")
+    if logo_job is not None:
+        if not logo_job.done:
+            st.info("⏳ جاري توليد الشعارات ...")
+        elif logo_job.error is not None:
+            st.error(f"حدث خطأ أثناء توليد الشعار. حاول مرة أخرى. ({logo_job.error})")
         else:
-            st.error("فشل في تحميل الصورة من الرابط.")
-            return None
-    except Exception as e:
-        st.error(f"حدث خطأ: {e}")
-        return None
+            file_paths = logo_job.result
+            columns = st.columns(2)
+            for i, file_path in enumerate(file_paths):
+                columns[i % 2].image(file_path, caption=f"الشعار المولد باستخدام DALL-E ({i + 1})")
+            st.success(f"تم حفظ الشعارات في المجلد: {os.path.dirname(file_paths[0])}")
+    rerun_while_running(logo_job)
 
 ##################################################################
 # مثال لصفحة كتابة المحتوى النصي (text_content)
@@ -187,10 +188,7 @@ def text_content_page():
     st.title("معلومات المحتوى التسويقي")
 
     comments = st.text_area("أضف تفاصيل حوّل منتجك هنا:")
-    content_types = [
-        "نشر خبر", "إعلان نصي", "سرد قصصي",
-        "سرد تحفيزي", "محتوى تفصيلي", "محتوى مختصر", "أخرى"
-    ]
+    content_types = CONTENT_TYPES
     content_type = st.selectbox("اختر نوع المحتوى التسويقي:", content_types)
     if content_type == "أخرى":
         custom_content_type = st.text_input("أدخل نوع المحتوى التسويقي:")
@@ -223,15 +221,22 @@ def text_content_page():
         if custom_target_audience:
             target_audience = [audience for audience in target_audience if audience != "أخرى"] + [custom_target_audience]
 
+    voice_job = None
     col1, col2 = st.columns(2)
     with col1:
         if st.button("توصيه لاختيار نوع المحتوى التسويقي"):
             if comments:
-                recommended_type = get_recommended_marketing_type(comments, content_types)
-                st.success(f"التوصية: أفضل نوع تسويقي لمنتجك هو '{recommended_type}'")
+                submit_job("recommendation_job", run_recommendation, comments, content_types)
             else:
                 st.warning("يرجى إدخال وصف المنتج للحصول على التوصية.")
 
+        recommendation_job = session_job("recommendation_job")
+        if recommendation_job is not None:
+            if not recommendation_job.done:
+                st.info("⏳ جاري تحديد النوع المناسب ...")
+            else:
+                st.success(f"التوصية: أفضل نوع تسويقي لمنتجك هو '{recommendation_job.result}'")
+
     with col2:
         if st.button("توليد النص التسويقي"):
             if marketing_field and target_audience:
@@ -243,55 +248,28 @@ def text_content_page():
                 - نوع المحتوى التسويقي: {content_type if content_type else 'غير محدد'}
                 - المناسبة: {event if event and event != 'لا شيء' else 'لا توجد مناسبة محددة'}
                 """
-                st.markdown(summary_message)
-
-                bot_response = model_text(marketing_field, target_audience, content_type, event, comments)
-                st.text_area("النص التسويقي المولد:", value=bot_response, height=200)
+                st.session_state.text_summary = summary_message
+                submit_job(
+                    "text_job", run_model_text,
+                    marketing_field, target_audience, content_type, event, comments
+                )
             else:
                 st.warning("يرجى تحديد مجال التسويق والجمهور المستهدف.")
 
-def get_recommended_marketing_type(description, content_options):
-    prompt = (
-        f"أنت خبير في التسويق، بناءً على وصف المنتج التالي، "
-        f"اختر أفضل نوع تسويق يناسبه من القائمة المقدمة:\n"
-        f"وصف المنتج: {description}\n"
-        f"الخيارات المتاحة: {', '.join(content_options)}\n"
-        f"يرجى تقديم النوع الأنسب فقط دون تفاصيل إضافية."
-    )
-    try:
-        response = anthropic_client.messages.create(
-            model="claude-3-5-sonnet-20241022",
-            max_tokens=50,
-            messages=[{"role": "user", "content": prompt}]
-        )
-        if response and hasattr(response, 'content'):
-            return response.content[0].text.strip()
-        else:
-            return "تعذر تحديد النوع المناسب، الرجاء التحقق من المدخلات."
-    except Exception as e:
-        return f"حدث خطأ أثناء التوصية: {e}"
-
-def model_text(marketing_field, target_audience, content_type, event, comments):
-    user_message = (
-        f"أجب كخبير تسويق. هدفك إنشاء نص تسويقي جذاب. "
-        f"- مجال التسويق: {marketing_field}\n"
-        f"- الجمهور المستهدف: {', '.join(target_audience) if target_audience else 'غير محدد'}\n"
-        f"- نوع المحتوى التسويقي: {content_type}\n"
-        f"- المناسبة: {event if event != 'لا شيء' else 'لا توجد مناسبة'}\n"
-        f"- الملاحظات: {comments if comments else 'لا توجد ملاحظات'}\n"
-    )
-    try:
-        response = anthropic_client.messages.create(
-            model="claude-3-5-sonnet-20241022",
-            max_tokens=1024,
-            messages=[{"role": "user", "content": user_message}]
-        )
-        if response and hasattr(response, 'content'):
-            return response.content[0].text
-        else:
-            return "تعذر توليد النص التسويقي."
-    except Exception as e:
-        return f"حدث خطأ أثناء توليد النص باستخدام Claude: {e}"
+        text_job = session_job("text_job")
+        if text_job is not None:
+            st.markdown(st.session_state.get("text_summary", ""))
+            if not text_job.done:
+                st.markdown((text_job.partial or "📝 جاري توليد المحتوى ...") + "▌")
+            else:
+                bot_response = text_job.result
+                if text_job.error is not None:
+                    bot_response = f"حدث خطأ أثناء توليد النص: {text_job.error}"
+                st.text_area("النص التسويقي المولد:", value=bot_response, height=200)
+                if text_job.error is None:
+                    voice_job = voiceover_section("text_voice_job", bot_response)
+
+    rerun_while_running(recommendation_job, text_job, voice_job)
 
 ##################################################################
 # صفحة مستشارك التسويقي الذكي (marketing_advisor)
@@ -306,84 +284,25 @@ def marketing_advisor_page():
 
     if st.button("إرسال"):
         if product_name.strip() and product_description.strip():
-            try:
-                search_query = product_description
-
-                with st.spinner("🔍  اقرأ لك السوق الآن ..."):
-                    search_results = google_search.results(search_query, num_results=10)
-
-                # جلب الروابط من نتائج البحث
-                urls = [result.get('link', '') for result in search_results]
-
-                with st.spinner("📄 أحلل لك استراتجيات السوق.."):
-                    # تشغيل الجلب غير المتزامن للروابط
-                    page_contents = asyncio.run(fetch_all_content(urls))
-
-                formatted_content = "\n\n".join(page_contents)
-
-                # مثال توضيحي للاعتماد عليه في بناء النموذج
-                example_content = """
-                🌟 تمر العجوة الفاخر - مذاق الأجداد بنكهة حديثة
-
-                **الوصف:**
-                تمتع بمذاق تمر العجوة الفاخر، المقطوف بعناية من مزارع المدينة المنورة. يتميز بنكهته الغنية وقيمته الغذائية العالية.
-
-                **المميزات التنافسية:**
-                - طبيعي 100% بدون إضافات
-                - حاصل على شهادة الجودة السعودية
-                - طعم فريد وقوام ناعم
-                - شحن سريع لجميع مناطق المملكة
-
-                **الجمهور المستهدف:**
-                - محبي التمور الفاخرة
-                - المهتمون بالتغذية الصحية
-                - الباحثون عن هدايا فاخرة
-
-                **اقتراحات للحملات التسويقية:**
-                1. **حملات موسمية:** عروض شهر رمضان
-                2. **حملات رقمية:** فيديوهات عن فوائد التمر
-                **شعار الحملة:** تمر العجوة – تراث أصيل، مذاق فريد
-                """
-
-                marketing_prompt = f"""
-                اعتمد على المثال التالي لإنشاء محتوى تسويقي مشابه للمنتج التالي، 
-                مع دراسة المحتوى المقدم واستنتاج استراتيجيات التسويق منه:
-
-                **مثال:**
-                {example_content}
-
-                **المحتوى المستخرج من الإنترنت:**
-                {formatted_content}
-
-                **المطلوب:**
-                - تحليل المحتوى المقدم واستخراج الاستراتيجيات التسويقية منه.
-                - إنشاء محتوى تسويقي يشمل:
-                  - وصف جذاب للمنتج.
-                  - فوائد تنافسية.
-                  - الجمهور المستهدف.
-                  - اقتراحات للحملات التسويقية.
-                  - شعار مناسب.
-
-                يرجى التأكد من أن المحتوى يظهر بوضوح وبشكل منظم مع استخدام العناوين والقوائم.
-                """
-
-                with st.spinner("📝 جاري توليد المحتوى ..."):
-                    marketing_response = anthropic_client.messages.create(
-                        model="claude-3-5-sonnet-20241022",
-                        max_tokens=1024,
-                        messages=[{"role": "user", "content": marketing_prompt}]
-                    )
-
-                if marketing_response and hasattr(marketing_response, 'content'):
-                    formatted_text = marketing_response.content[0].text
-                else:
-                    formatted_text = "تعذر جلب الاستجابة من Claude."
-
-                # تحسين تنسيق النص
-                formatted_text = formatted_text.replace("\n\n", "\n")
+            submit_job("advisor_job", run_marketing_advisor, product_name, product_description)
+        else:
+            st.warning("⚠ الرجاء إدخال اسم المنتج ووصفه قبل الضغط على إرسال")
 
-                st.markdown("### اقترح لك:")
+    advisor_job = session_job("advisor_job")
+    voice_job = None
+    if advisor_job is not None:
+        if advisor_job.error is not None:
+            st.error(f"❌ حدث خطأ: {advisor_job.error}")
+        elif not advisor_job.done and not advisor_job.partial:
+            st.info(advisor_job.stage or "⏳ في انتظار دورك ...")
+        else:
+            st.markdown("### اقترح لك:")
+            if not advisor_job.done:
+                st.markdown(advisor_job.partial + "▌")
+            else:
+                formatted_text, search_results = advisor_job.result
                 st.markdown(formatted_text)
+                voice_job = voiceover_section("advisor_voice_job", formatted_text)
 
                 st.markdown("### المصادر المستخدمة:")
                 for result in search_results:
@@ -392,36 +311,51 @@ def marketing_advisor_page():
                     if link and link != '#':
                         st.markdown(f"- [{title}]({link})")
 
-            except Exception as e:
-                st.error(f"❌ حدث خطأ: {e}")
-        else:
-            st.warning("⚠ الرجاء إدخال اسم المنتج ووصفه قبل الضغط على إرسال")
-
     st.markdown("---")
     st.markdown("Sawq Team, 2025")
+    rerun_while_running(advisor_job, voice_job)
 
-async def fetch_content_async(url):
-    """جلب محتوى الصفحات بشكل غير متزامن (Async)"""
-    try:
-        async with aiohttp.ClientSession() as session:
-            async with session.get(url, timeout=10) as response:
-                if response.status == 200:
-                    html = await response.text()
-                    soup = BeautifulSoup(html, 'html.parser')
-                    # نجلب 5 فقرات فقط
-                    paragraphs = soup.find_all('p', limit=5)
-                    return '\n'.join([p.get_text() for p in paragraphs])[:1500]
-                else:
-                    return f"❌ لم يتمكن من الوصول إلى {url} - حالة HTTP: {response.status}"
-    except asyncio.TimeoutError:
-        return f"⏳ انتهت مهلة الاتصال بالموقع: {url}"
-    except Exception as e:
-        return f"⚠️ خطأ أثناء جلب المحتوى من {url}: {e}"
-
-async def fetch_all_content(urls):
-    tasks = [fetch_content_async(url) for url in urls if url]
-    results = await asyncio.gather(*tasks)
-    return results
+##################################################################
+# صفحة القياسات (admin) لمتابعة زمن كل مرحلة ونسب الإصابة والأخطاء
+# تُفتح عبر ?page=admin&token=... عند ضبط ADMIN_TOKEN
+##################################################################
+def admin_page():
+    st.title("لوحة القياسات")
+    snapshot = metrics.snapshot()
+
+    st.markdown("### زمن المراحل (ثانية)")
+    st.table([
+        {
+            "المقياس": h["name"],
+            "الوسوم": ", ".join(f"{k}={v}" for k, v in h["labels"].items()),
+            "العدد": h["count"],
+            "p50": h["p50"], "p95": h["p95"], "p99": h["p99"],
+        }
+        for h in snapshot["histograms"]
+    ])
+
+    st.markdown("### العدادات")
+    st.table([
+        {
+            "المقياس": c["name"],
+            "الوسوم": ", ".join(f"{k}={v}" for k, v in c["labels"].items()),
+            "القيمة": c["value"],
+        }
+        for c in snapshot["counters"]
+    ])
+
+    st.markdown("### الذاكرة المؤقتة والمهام")
+    st.json(snapshot["gauges"])
+
+    col1, col2 = st.columns(2)
+    with col1:
+        st.download_button("تنزيل JSON", metrics.to_json(), "metrics.json", "application/json")
+    with col2:
+        st.download_button("تنزيل Prometheus", metrics.to_prometheus(), "metrics.prom", "text/plain")
+
+query_params = st.experimental_get_query_params()
+if ADMIN_TOKEN and query_params.get("page") == ["admin"] and query_params.get("token") == [ADMIN_TOKEN]:
+    st.session_state.page = "admin"
 
 ########################################
 # توجيه الصفحات بناءً على session_state
@@ -434,3 +368,5 @@ elif st.session_state.page == "text_content":
     text_content_page()
 elif st.session_state.page == "brand_design":
     brand_design_page()
+elif st.session_state.page == "admin":
+    admin_page()
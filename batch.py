@@ -0,0 +1,242 @@
+"""
+توليد المحتوى التسويقي لكتالوج منتجات كامل دون واجهة.
+
+    python batch.py products.csv -o results.jsonl --workers 4 --rpm 50 --tpm 40000
+
+يقبل ملف CSV أو JSONL بالحقول: id (أو sku)، product_name، description،
+marketing_field، target_audience (قائمة أو نص مفصول بـ | أو ،)، content_type، event،
+logo_style، logo_description. تُكتب النتائج سطرًا سطرًا في ملف JSONL، وعند إعادة
+التشغيل تُتخطى المنتجات التي اكتملت بنجاح في المرة السابقة. marketing_field و
+target_audience مطلوبان كما في صفحة المحتوى النصي، والمعرّفات يجب ألا تتكرر.
+"""
+import argparse
+import csv
+import json
+import os
+import re
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from clients import get_llm_router
+from context_builder import estimate_tokens
+from generation import CONTENT_TYPES, generate_logo_prompt, get_recommended_marketing_type, model_text
+from router import RouterError
+
+##############################
+# إعدادات الدفعات الافتراضية
+##############################
+DEFAULT_WORKERS = 4
+DEFAULT_RPM = 50          # حد الطلبات في الدقيقة
+DEFAULT_TPM = 40000       # حد التوكنات (مدخلات + أقصى مخرجات) في الدقيقة
+
+_AUDIENCE_SEPARATORS = re.compile(r"[|،,]")
+
+
+class Cancelled(Exception):
+    """أُوقف التشغيل قبل أن يبدأ هذا الطلب"""
+
+
+class TokenBucket:
+    """دلو توكنات يمتلئ بمعدل ثابت؛ acquire ينتظر حتى تتوفر الكمية المطلوبة"""
+
+    def __init__(self, per_minute, capacity=None, stopped=None):
+        self.rate = per_minute / 60.0
+        self.capacity = capacity or per_minute
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+        self._stopped = stopped or threading.Event()
+
+    def acquire(self, amount=1):
+        amount = min(amount, self.capacity)
+        while True:
+            if self._stopped.is_set():
+                raise Cancelled()
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= amount:
+                    self._tokens -= amount
+                    return
+                wait = (amount - self._tokens) / self.rate
+            self._stopped.wait(wait)
+
+
+class RateLimiter:
+    """حد مزدوج لعدد الطلبات وعدد التوكنات في الدقيقة"""
+
+    def __init__(self, rpm=DEFAULT_RPM, tpm=DEFAULT_TPM):
+        self.stopped = threading.Event()
+        self.requests = TokenBucket(rpm, stopped=self.stopped)
+        self.tokens = TokenBucket(tpm, stopped=self.stopped)
+
+    def stop(self):
+        """رفض كل طلب لم يبدأ بعد (بما فيها الطلبات المنتظرة في الدلو)"""
+        self.stopped.set()
+
+    def acquire(self, prompt, max_tokens):
+        self.requests.acquire(1)
+        self.tokens.acquire(estimate_tokens(str(prompt)) + max_tokens)
+
+
+def _field(row, name):
+    value = row.get(name)
+    return "" if value is None else str(value).strip()
+
+
+def read_products(path):
+    """قراءة المنتجات من ملف CSV أو JSONL؛ ترفع ValueError إذا تكررت المعرّفات"""
+    with open(path, encoding="utf-8-sig", newline="") as file:
+        if path.endswith(".jsonl"):
+            rows = [json.loads(line) for line in file if line.strip()]
+        else:
+            rows = list(csv.DictReader(file))
+    for index, row in enumerate(rows):
+        # الخلية الفارغة في عمود id أو sku تُعامل كغيابه، وإلا تشاركت الصفوف المعرّف ""
+        row["id"] = _field(row, "id") or _field(row, "sku") or str(index)
+        audience = row.get("target_audience") or []
+        if isinstance(audience, str):
+            audience = [item.strip() for item in _AUDIENCE_SEPARATORS.split(audience) if item.strip()]
+        row["target_audience"] = audience
+    seen, duplicates = set(), set()
+    for row in rows:
+        (duplicates if row["id"] in seen else seen).add(row["id"])
+    if duplicates:
+        raise ValueError(f"معرّفات مكررة في {path}: {', '.join(sorted(duplicates))}")
+    return rows
+
+
+def completed_ids(output_path):
+    """معرّفات المنتجات التي اكتملت بنجاح في تشغيل سابق"""
+    done = set()
+    if not os.path.exists(output_path):
+        return done
+    with open(output_path, encoding="utf-8") as file:
+        for line in file:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue  # سطر مقطوع من تشغيل توقف فجأة
+            if "error" not in record:
+                done.add(str(record["id"]))
+    return done
+
+
+def generate_product(product):
+    """
+    توليد التوصية والنص ووصف الشعار لمنتج واحد. حد المعدل يُطبَّق على كل محاولة
+    يرسلها الموجّه (انظر run_batch) لا على كل استدعاء، لأن الاستدعاء الواحد قد يصير
+    طلبًا احتياطيًا وإعادات محاولة.
+    """
+    missing = [field for field in ("marketing_field", "target_audience") if not product.get(field)]
+    if missing:
+        # تُكتب سجل خطأ دون دفع ثمن نص بمدخلات ناقصة
+        raise ValueError(f"حقول مطلوبة ناقصة: {', '.join(missing)}")
+    description = product.get("description", "")
+    content_type = product.get("content_type")
+    record = {"id": product["id"]}
+
+    if not content_type and description:
+        content_type = get_recommended_marketing_type(description, CONTENT_TYPES, raise_errors=True)
+        record["recommended_type"] = content_type
+
+    args = (
+        product["marketing_field"], product["target_audience"],
+        content_type, product.get("event") or "لا شيء", description
+    )
+    record["text"] = model_text(*args, raise_errors=True)
+
+    if product.get("product_name") and product.get("logo_style"):
+        record["logo_prompt"] = generate_logo_prompt(
+            product["product_name"], product["logo_style"], product.get("logo_description")
+        )
+    return record
+
+
+def run_batch(products, output_path, workers=DEFAULT_WORKERS, rpm=DEFAULT_RPM, tpm=DEFAULT_TPM):
+    """
+    توليد المحتوى لكل المنتجات بالتوازي مع احترام حدود المعدل،
+    وكتابة كل نتيجة فور اكتمالها. تُرجع عدد النجاحات والإخفاقات.
+    """
+    done = completed_ids(output_path)
+    pending = [product for product in products if str(product["id"]) not in done]
+    limiter = RateLimiter(rpm, tpm)
+    succeeded = failed = 0
+
+    # تشغيل سابق انقطع في منتصف سطر: نبدأ سطرًا جديدًا حتى لا تختلط النتائج
+    broken_line = False
+    if os.path.exists(output_path) and os.path.getsize(output_path):
+        with open(output_path, "rb") as file:
+            file.seek(-1, os.SEEK_END)
+            broken_line = file.read(1) != b"\n"
+
+    router = get_llm_router()
+    previous_hook, router.before_attempt = router.before_attempt, limiter.acquire
+
+    def write(future):
+        nonlocal succeeded, failed
+        try:
+            record = future.result()
+            succeeded += 1
+        except Cancelled:
+            return  # لم يُرسل أي طلب؛ يُولَّد عند الاستئناف
+        except Exception as e:
+            record = {"id": futures[future]["id"], "error": str(e)}
+            if isinstance(e, RouterError):
+                record["errors"] = e.errors  # خطأ كل مزود لتشخيص المنتجات الفاشلة
+            failed += 1
+        output.write(json.dumps(record, ensure_ascii=False) + "\n")
+        output.flush()
+
+    with open(output_path, "a", encoding="utf-8") as output, \
+            ThreadPoolExecutor(max_workers=workers) as pool:
+        if broken_line:
+            output.write("\n")
+        futures = {pool.submit(generate_product, product): product for product in pending}
+        written = set()
+        try:
+            for future in as_completed(futures):
+                write(future)
+                written.add(future)
+        except KeyboardInterrupt:
+            # إيقاف الإنفاق فورًا: إلغاء المنتظر، وكتابة ما كان قيد التنفيذ حتى يطابق
+            # ملف النتائج ما دُفع ثمنه ولا يُعاد توليده عند الاستئناف
+            limiter.stop()
+            for future in futures:
+                future.cancel()
+            running = [future for future in futures if not future.cancelled() and future not in written]
+            for future in as_completed(running):
+                write(future)
+            raise
+        finally:
+            router.before_attempt = previous_hook
+    return succeeded, failed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("input", help="ملف المنتجات (CSV أو JSONL)")
+    parser.add_argument("-o", "--output", default="results.jsonl", help="ملف النتائج (JSONL)")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS)
+    parser.add_argument("--rpm", type=int, default=DEFAULT_RPM, help="حد الطلبات في الدقيقة")
+    parser.add_argument("--tpm", type=int, default=DEFAULT_TPM, help="حد التوكنات في الدقيقة")
+    args = parser.parse_args()
+
+    try:
+        products = read_products(args.input)
+    except ValueError as e:
+        sys.exit(str(e))
+    skipped = len(completed_ids(args.output))
+    try:
+        succeeded, failed = run_batch(products, args.output, args.workers, args.rpm, args.tpm)
+    except KeyboardInterrupt:
+        print(f"أُوقف التشغيل؛ حُفظت النتائج المكتملة في {args.output} وسيُستأنف منها عند إعادة التشغيل.")
+        sys.exit(130)
+    print(f"نجح: {succeeded} | فشل: {failed} | مكتمل مسبقًا: {skipped}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,521 @@
+"""
+اختبار حمل شامل لمسارات التطبيق (المستشار التسويقي، النص التسويقي، الشعار، التعليق الصوتي) دون إنترنت.
+
+يشغّل خوادم محلية بديلة لبحث جوجل (Custom Search JSON) وClaude (مع التدفق) وصور
+OpenAI (مع المحادثة المتدفقة للطلبات الاحتياطية) وتحويل النص إلى كلام ومواقع HTML سريعة وبطيئة، ثم يحاكي جلسات متزامنة كثيرة تُرسل المهام عبر
+منفذ المهام المشترك كما تفعل الصفحات، ويطبع الإنتاجية وزمن الذيل والذاكرة.
+
+التشغيل من جذر المشروع:
+    python benchmarks/load.py [--sessions 32] [--iterations 5] [--json load.json]
+                              [--max-p95 10] [--min-throughput 2] [--max-rss-mb 500]
+
+يخرج برمز 1 إذا تجاوزت النتائج أي حد مضبوط، فيصلح بوابةً لاكتشاف التراجع في الأداء.
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import random
+import resource
+import statistics
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+FLOWS = ("advisor", "text", "brand", "voice")
+WORDS = (
+    "التسويق", "المنتج", "العملاء", "الجودة", "العروض", "الموسم", "الحملة", "المحتوى",
+    "الهوية", "السوق", "المنافسة", "القيمة", "الشحن", "الهدايا", "الرقمية", "الولاء",
+)
+
+
+def fake_paragraph(seed, index, words=40):
+    """فقرة عربية حتمية مختلفة لكل صفحة"""
+    digest = hashlib.sha256(f"{seed}:{index}".encode("utf-8")).digest()
+    return " ".join(WORDS[digest[i % len(digest)] % len(WORDS)] for i in range(words)) + "."
+
+
+##############################
+# الخوادم المحلية البديلة
+##############################
+class FakeServices:
+    """
+    خادم aiohttp واحد في خيط خلفي يحاكي كل الخدمات الخارجية بزمن استجابة قابل للضبط.
+    نسبة slow_ratio من روابط البحث تشير إلى صفحات أبطأ من مهلة الجلب.
+    """
+
+    def __init__(self, search_delay=0.05, page_delay=0.02, slow_delay=6.0, slow_ratio=0.2,
+                 ttft=0.3, token_interval=0.01, tokens=120, image_delay=0.5, image_bytes=64 * 1024,
+                 claude_error_rate=0.0, claude_stall_rate=0.0, claude_stall=10.0, tts_delay=0.2):
+        self.search_delay = search_delay
+        self.page_delay = page_delay
+        self.slow_delay = slow_delay
+        self.slow_ratio = slow_ratio
+        self.ttft = ttft
+        self.token_interval = token_interval
+        self.tokens = tokens
+        self.image_delay = image_delay
+        self.claude_error_rate = claude_error_rate   # نسبة طلبات Claude التي ترد بخطأ 529
+        self.claude_stall_rate = claude_stall_rate   # نسبة طلبات Claude التي يتأخر أول توكن فيها
+        self.claude_stall = claude_stall
+        self.tts_delay = tts_delay
+        self._random = random.Random(0)
+        self._cached_prefixes = set()
+        self.image = b"\x89PNG\r\n\x1a\n" + os.urandom(image_bytes)
+        self.requests = {}
+        self.url = None
+        self._loop = asyncio.new_event_loop()
+        self._runner = None
+
+    def start(self):
+        ready = threading.Event()
+        threading.Thread(target=self._serve, args=(ready,), name="fake-services", daemon=True).start()
+        ready.wait()
+        return self
+
+    def stop(self):
+        asyncio.run_coroutine_threadsafe(self._shutdown(), self._loop).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+
+    async def _shutdown(self):
+        await self._runner.cleanup()
+        # صفحات بطيئة ما زالت تنتظر بعد أن تخلى عنها الجالب
+        pending = [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+
+    def _serve(self, ready):
+        from aiohttp import web
+
+        asyncio.set_event_loop(self._loop)
+        app = web.Application()
+        app.router.add_get("/customsearch/v1", self.search)
+        app.router.add_get("/site/{name}", self.page)
+        app.router.add_get("/file/{name}", self.file)
+        app.router.add_post("/v1/messages", self.messages)
+        app.router.add_post("/v1/chat/completions", self.chat)
+        app.router.add_post("/v1/images/generations", self.images)
+        app.router.add_get("/png/{name}", self.png)
+        app.router.add_post("/synthesize", self.synthesize)
+        self._runner = web.AppRunner(app, access_log=None)
+        self._loop.run_until_complete(self._runner.setup())
+        site = web.TCPSite(self._runner, "127.0.0.1", 0, backlog=1024)
+        self._loop.run_until_complete(site.start())
+        port = site._server.sockets[0].getsockname()[1]
+        self.url = f"http://127.0.0.1:{port}"
+        ready.set()
+        self._loop.run_forever()
+
+    def _count(self, name):
+        self.requests[name] = self.requests.get(name, 0) + 1
+
+    async def search(self, request):
+        from aiohttp import web
+
+        self._count("search")
+        await asyncio.sleep(self.search_delay)
+        query = request.query.get("q", "")
+        num = int(request.query.get("num", 10))
+        seed = hashlib.sha256(query.encode("utf-8")).hexdigest()[:12]
+        slow = round(num * self.slow_ratio)
+        items = []
+        for i in range(num):
+            if i == num - 1:
+                link = f"{self.url}/file/{seed}-{i}.pdf"  # يُرفض لأنه ليس HTML
+            else:
+                link = f"{self.url}/site/{seed}-{i}?slow={int(i < slow)}&utm_source=cse"
+            items.append({"title": f"نتيجة {i}", "link": link, "snippet": fake_paragraph(seed, i, 12)})
+        return web.json_response({"items": items})
+
+    async def page(self, request):
+        from aiohttp import web
+
+        self._count("page")
+        slow = request.query.get("slow") == "1"
+        await asyncio.sleep(self.slow_delay if slow else self.page_delay)
+        name = request.match_info["name"]
+        paragraphs = "".join(f"<p>{fake_paragraph(name, i)}</p>" for i in range(8))
+        body = (
+            "<html><head><title>صفحة</title><script>var x = 1;</script></head><body>"
+            f"<nav>الرئيسية | من نحن</nav><article>{paragraphs}</article>"
+            "<footer>جميع الحقوق محفوظة</footer></body></html>"
+        )
+        return web.Response(text=body, content_type="text/html", charset="utf-8")
+
+    async def file(self, request):
+        from aiohttp import web
+
+        self._count("file")
+        return web.Response(body=b"%PDF-1.4", content_type="application/pdf")
+
+    async def messages(self, request):
+        from aiohttp import web
+
+        self._count("messages")
+        body = await request.json()
+        if self._random.random() < self.claude_error_rate:
+            self._count("messages_error")
+            return web.json_response(
+                {"type": "error", "error": {"type": "overloaded_error", "message": "Overloaded"}},
+                status=529,
+            )
+        ttft = self.ttft
+        if self._random.random() < self.claude_stall_rate:
+            self._count("messages_stalled")
+            ttft = self.claude_stall
+        content = body["messages"][0]["content"]
+        blocks = [{"type": "text", "text": content}] if isinstance(content, str) else content
+        # محاكاة تخزين البادئة: الكتلة التي عليها cache_control تُقرأ من الذاكرة إذا سبق إرسالها
+        input_tokens = cache_read = cache_write = 0
+        for block in blocks:
+            tokens = max(1, len(block["text"]) // 3)
+            if "cache_control" not in block:
+                input_tokens += tokens
+            elif block["text"] in self._cached_prefixes:
+                cache_read += tokens
+            else:
+                self._cached_prefixes.add(block["text"])
+                cache_write += tokens
+        tokens = min(self.tokens, body.get("max_tokens", self.tokens))
+        pieces = [f"{WORDS[i % len(WORDS)]} " + ("\n\n" if i % 20 == 19 else "") for i in range(tokens)]
+        message = {
+            "id": "msg_load", "type": "message", "role": "assistant", "model": body["model"],
+            "content": [], "stop_reason": None, "stop_sequence": None,
+            "usage": {
+                "input_tokens": input_tokens, "output_tokens": 1,
+                "cache_read_input_tokens": cache_read, "cache_creation_input_tokens": cache_write,
+            },
+        }
+        if not body.get("stream"):
+            await asyncio.sleep(ttft + self.token_interval * tokens)
+            message.update(
+                content=[{"type": "text", "text": "".join(pieces)}], stop_reason="end_turn",
+                usage={**message["usage"], "output_tokens": tokens},
+            )
+            return web.json_response(message)
+
+        response = web.StreamResponse(headers={"Content-Type": "text/event-stream"})
+        await response.prepare(request)
+
+        async def send(event, data):
+            payload = json.dumps({"type": event, **data}, ensure_ascii=False)
+            await response.write(f"event: {event}\ndata: {payload}\n\n".encode("utf-8"))
+
+        try:
+            await send("message_start", {"message": message})
+            await send("content_block_start", {"index": 0, "content_block": {"type": "text", "text": ""}})
+            await asyncio.sleep(ttft)
+            for piece in pieces:
+                await send("content_block_delta", {"index": 0, "delta": {"type": "text_delta", "text": piece}})
+                await asyncio.sleep(self.token_interval)
+            await send("content_block_stop", {"index": 0})
+            await send("message_delta", {
+                "delta": {"stop_reason": "end_turn", "stop_sequence": None},
+                "usage": {"output_tokens": tokens},
+            })
+            await send("message_stop", {})
+            await response.write_eof()
+        except ConnectionResetError:
+            pass  # ألغى الموجّه الطلب بعد أن سبقه طلب احتياطي
+        return response
+
+    async def chat(self, request):
+        from aiohttp import web
+
+        self._count("chat")
+        body = await request.json()
+        tokens = min(self.tokens, body.get("max_tokens", self.tokens))
+        response = web.StreamResponse(headers={"Content-Type": "text/event-stream"})
+        await response.prepare(request)
+        try:
+            await asyncio.sleep(self.ttft)
+            for i in range(tokens):
+                chunk = {
+                    "id": "chatcmpl-load", "object": "chat.completion.chunk", "model": body["model"],
+                    "choices": [{"index": 0, "delta": {"content": f"{WORDS[i % len(WORDS)]} "},
+                                 "finish_reason": None}],
+                }
+                await response.write(f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n".encode("utf-8"))
+                await asyncio.sleep(self.token_interval)
+            await response.write(b"data: [DONE]\n\n")
+            await response.write_eof()
+        except ConnectionResetError:
+            pass
+        return response
+
+    async def images(self, request):
+        from aiohttp import web
+
+        self._count("images")
+        body = await request.json()
+        await asyncio.sleep(self.image_delay)
+        seed = hashlib.sha256(body["prompt"].encode("utf-8")).hexdigest()[:12]
+        data = [{"url": f"{self.url}/png/{seed}-{i}.png"} for i in range(body.get("n", 1))]
+        return web.json_response({"created": int(time.time()), "data": data})
+
+    async def png(self, request):
+        from aiohttp import web
+
+        self._count("png")
+        return web.Response(body=self.image, content_type="image/png")
+
+    async def synthesize(self, request):
+        from aiohttp import web
+
+        self._count("tts")
+        body = await request.json()
+        await asyncio.sleep(self.tts_delay)
+        # إطار MP3 وهمي بحجم يتناسب مع طول المقطع
+        audio = b"\xff\xfb\x90\x00" + b"\x00" * (len(body["text"].encode("utf-8")) * 40)
+        return web.Response(body=audio, content_type="audio/mpeg")
+
+
+def configure_environment(url, directory, workers):
+    """توجيه كل العملاء إلى الخوادم المحلية؛ يجب أن يسبق استيراد clients"""
+    os.environ.update({
+        "ANTHROPIC_API_KEY": "load", "OPENAI_API_KEY": "load",
+        "GOOGLE_API_KEY": "load", "GOOGLE_CSE_ID": "load",
+        "ANTHROPIC_BASE_URL": url,
+        "OPENAI_API_BASE": f"{url}/v1",
+        "GOOGLE_SEARCH_URL": url,
+        "PAGE_CACHE_PATH": os.path.join(directory, "pages.sqlite3"),
+        "LOGO_DIR": os.path.join(directory, "images"),
+        "TTS_URL": url,
+        "AUDIO_DIR": os.path.join(directory, "audio"),
+        "JOB_WORKERS": str(workers),
+        "JOB_QUEUE_LIMIT": "100000",
+        "JOB_SESSION_LIMIT": "100000",
+    })
+    os.environ.pop("METRICS_PORT", None)
+
+
+##############################
+# محاكاة الجلسات
+##############################
+def flow_steps(flow, session, iteration):
+    """المهام التي ترسلها الصفحة لكل مسار، بمدخلات فريدة حتى لا تخدمها الذاكرة المؤقتة"""
+    from advisor import run_marketing_advisor
+    from generation import (
+        CONTENT_TYPES, LOGO_STYLES, generate_logo_prompt, run_logo_generation, run_model_text,
+        run_recommendation, run_voiceover
+    )
+
+    tag = f"{session}-{iteration}"
+    description = f"منتج تجريبي رقم {tag} من التمور الفاخرة المحشوة باللوز"
+    if flow == "advisor":
+        return [(run_marketing_advisor, (f"تمر {tag}", description))]
+    if flow == "text":
+        return [
+            (run_recommendation, (description, CONTENT_TYPES)),
+            (run_model_text, ("الأغذية", ["العائلات"], CONTENT_TYPES[0], "رمضان", description)),
+        ]
+    if flow == "voice":
+        # نص أغلبه ثابت مع جملة متغيرة: تُعاد المقاطع المخزنة ولا يُولد إلا الجديد
+        copy = "\n".join(fake_paragraph("voice", i, 25) for i in range(10)) + f"\n{description}."
+        return [(run_voiceover, (copy,))]
+    return [(run_logo_generation, (generate_logo_prompt(f"متجر {tag}", LOGO_STYLES[0], description),))]
+
+
+def run_session(session, flows, iterations, results, poll_interval):
+    """جلسة واحدة: ترسل مهمة وتنتظرها كما تفعل الصفحة بإعادة التشغيل الدورية"""
+    from clients import get_job_executor
+
+    executor = get_job_executor()
+    session_id = f"load-{session}"
+    for iteration in range(iterations):
+        flow = flows[(session + iteration) % len(flows)]
+        started = time.perf_counter()
+        first_output = None
+        error = None
+        for fn, args in flow_steps(flow, session, iteration):
+            job = executor.get(executor.submit(session_id, fn, *args))
+            while not job.done:
+                if first_output is None and job.partial:  # نص جزئي أو أول مقطع صوت
+                    first_output = time.perf_counter() - started
+                time.sleep(poll_interval)
+            if job.error is not None:
+                error = job.error
+                break
+        elapsed = time.perf_counter() - started
+        results.append({
+            "flow": flow, "seconds": elapsed, "first_output": first_output,
+            "error": repr(error) if error is not None else None,
+        })
+
+
+def percentile(values, p):
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(p / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def summarize(results, wall_time, services, peak_traced):
+    from metrics import metrics
+
+    report = {
+        "wall_seconds": wall_time,
+        "requests": len(results),
+        "errors": sum(result["error"] is not None for result in results),
+        "throughput": len(results) / wall_time if wall_time else 0.0,
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        "peak_traced_mb": peak_traced / (1024 * 1024) if peak_traced is not None else None,
+        "upstream_requests": dict(services.requests),
+        "flows": {},
+        "stages": {},
+        "tokens": {},
+        "gauges": metrics.snapshot()["gauges"],
+    }
+    for flow in FLOWS:
+        rows = [result for result in results if result["flow"] == flow]
+        if not rows:
+            continue
+        seconds = [row["seconds"] for row in rows]
+        first = [row["first_output"] for row in rows if row["first_output"] is not None]
+        report["flows"][flow] = {
+            "count": len(rows),
+            "errors": sum(row["error"] is not None for row in rows),
+            "mean": statistics.mean(seconds),
+            **{f"p{p}": percentile(seconds, p) for p in (50, 95, 99)},
+            "first_output_p50": percentile(first, 50),
+            "first_output_p95": percentile(first, 95),
+        }
+    for histogram in metrics.snapshot()["histograms"]:
+        if histogram["name"] == "stage_seconds":
+            report["stages"][histogram["labels"]["stage"]] = {
+                key: histogram[key] for key in ("count", "p50", "p95", "p99")
+            }
+    for counter in metrics.snapshot()["counters"]:
+        if counter["name"] == "llm_tokens_total":
+            kind = counter["labels"]["kind"]
+            report["tokens"][kind] = report["tokens"].get(kind, 0) + counter["value"]
+        elif counter["name"] == "llm_prompt_cache_total":
+            report["tokens"]["prefix_" + counter["labels"]["outcome"]] = counter["value"]
+    report["sample_errors"] = sorted({r["error"] for r in results if r["error"]})[:5]
+    return report
+
+
+def print_report(report):
+    def ms(value):
+        return f"{value * 1000:9.0f}" if value is not None else "        -"
+
+    print(f"الطلبات: {report['requests']} | الأخطاء: {report['errors']} | "
+          f"الزمن: {report['wall_seconds']:.1f}s | الإنتاجية: {report['throughput']:.2f} طلب/ث")
+    rss = f"ذروة RSS: {report['peak_rss_mb']:.0f} MB"
+    if report["peak_traced_mb"] is not None:
+        rss += f" | ذروة tracemalloc: {report['peak_traced_mb']:.1f} MB"
+    print(rss)
+    print(f"{'المسار':<10}{'العدد':>7}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'أول ناتج p95':>14}")
+    for flow, row in report["flows"].items():
+        print(f"{flow:<10}{row['count']:>7}{ms(row['p50'])} {ms(row['p95'])} {ms(row['p99'])} "
+              f"{ms(row['first_output_p95'])}")
+    print("المراحل (p95 ms):", ", ".join(
+        f"{stage}={stats['p95'] * 1000:.0f}" for stage, stats in sorted(report["stages"].items())
+    ))
+    print("التوكنات:", report["tokens"])
+    print("الذاكرة المؤقتة:", {
+        key: round(value, 3) for key, value in report["gauges"].items() if key.endswith("hit_rate")
+    })
+    print("طلبات الخدمات البديلة:", report["upstream_requests"])
+    for error in report["sample_errors"]:
+        print("  خطأ:", error)
+
+
+def check_gates(report, args):
+    """قائمة بالحدود التي تجاوزها التشغيل"""
+    failures = []
+    if args.max_errors is not None and report["errors"] > args.max_errors:
+        failures.append(f"الأخطاء {report['errors']} > {args.max_errors}")
+    if args.min_throughput is not None and report["throughput"] < args.min_throughput:
+        failures.append(f"الإنتاجية {report['throughput']:.2f} < {args.min_throughput}")
+    if args.max_p95 is not None:
+        for flow, row in report["flows"].items():
+            if row["p95"] > args.max_p95:
+                failures.append(f"p95 لـ {flow} {row['p95']:.2f}s > {args.max_p95}s")
+    if args.max_rss_mb is not None and report["peak_rss_mb"] > args.max_rss_mb:
+        failures.append(f"ذروة RSS {report['peak_rss_mb']:.0f}MB > {args.max_rss_mb}MB")
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sessions", type=int, default=32, help="عدد الجلسات المتزامنة")
+    parser.add_argument("--iterations", type=int, default=5, help="عدد الطلبات لكل جلسة")
+    parser.add_argument("--flows", default=",".join(FLOWS), help="المسارات المشمولة مفصولة بفاصلة")
+    parser.add_argument("--workers", type=int, default=8, help="خيوط منفذ المهام (JOB_WORKERS)")
+    parser.add_argument("--poll-interval", type=float, default=0.02, help="فاصل فحص اكتمال المهمة")
+    parser.add_argument("--tracemalloc", action="store_true", help="قياس ذروة الذاكرة بـ tracemalloc (أبطأ)")
+    parser.add_argument("--search-delay", type=float, default=0.05)
+    parser.add_argument("--page-delay", type=float, default=0.02)
+    parser.add_argument("--slow-delay", type=float, default=6.0, help="زمن الصفحات البطيئة (أطول من مهلة الجلب)")
+    parser.add_argument("--ttft", type=float, default=0.3, help="زمن أول توكن من Claude البديل")
+    parser.add_argument("--token-interval", type=float, default=0.01)
+    parser.add_argument("--image-delay", type=float, default=0.5)
+    parser.add_argument("--tts-delay", type=float, default=0.2, help="زمن توليد مقطع صوت واحد")
+    parser.add_argument("--claude-error-rate", type=float, default=0.0, help="نسبة طلبات Claude الفاشلة")
+    parser.add_argument("--claude-stall-rate", type=float, default=0.0,
+                        help="نسبة طلبات Claude التي يتأخر أول توكن فيها (لاختبار الطلب الاحتياطي)")
+    parser.add_argument("--claude-stall", type=float, default=10.0, help="زمن تأخر أول توكن في الطلبات المتعثرة")
+    parser.add_argument("--json", help="كتابة التقرير الكامل في ملف JSON")
+    parser.add_argument("--max-p95", type=float, help="أقصى p95 مقبول لكل مسار بالثواني")
+    parser.add_argument("--min-throughput", type=float, help="أدنى إنتاجية مقبولة (طلب/ث)")
+    parser.add_argument("--max-rss-mb", type=float, help="أقصى ذروة RSS مقبولة")
+    parser.add_argument("--max-errors", type=int, default=0, help="أقصى عدد أخطاء مقبول")
+    args = parser.parse_args()
+
+    flows = [flow.strip() for flow in args.flows.split(",") if flow.strip()]
+    unknown = set(flows) - set(FLOWS)
+    if unknown:
+        parser.error(f"مسارات غير معروفة: {', '.join(sorted(unknown))}")
+
+    services = FakeServices(
+        search_delay=args.search_delay, page_delay=args.page_delay, slow_delay=args.slow_delay,
+        ttft=args.ttft, token_interval=args.token_interval, image_delay=args.image_delay,
+        claude_error_rate=args.claude_error_rate, claude_stall_rate=args.claude_stall_rate,
+        claude_stall=args.claude_stall, tts_delay=args.tts_delay,
+    ).start()
+    with tempfile.TemporaryDirectory(prefix="sawq-load-") as directory:
+        configure_environment(services.url, directory, args.workers)
+        if args.tracemalloc:
+            tracemalloc.start()
+
+        results = []
+        threads = [
+            threading.Thread(
+                target=run_session, args=(session, flows, args.iterations, results, args.poll_interval),
+                name=f"session-{session}"
+            )
+            for session in range(args.sessions)
+        ]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        wall_time = time.perf_counter() - started
+
+        peak_traced = tracemalloc.get_traced_memory()[1] if args.tracemalloc else None
+        report = summarize(results, wall_time, services, peak_traced)
+        services.stop()
+
+    print_report(report)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as file:
+            json.dump(report, file, ensure_ascii=False, indent=2)
+
+    failures = check_gates(report, args)
+    for failure in failures:
+        print("تجاوز الحد:", failure)
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
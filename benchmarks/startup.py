@@ -0,0 +1,119 @@
+"""
+قياس زمن بدء التشغيل وتكلفة كل إعادة تشغيل لسكربت Streamlit، قبل وبعد
+التحميل المتأخر للعملاء والمكتبات.
+
+التشغيل من جذر المشروع:
+    python benchmarks/startup.py [--repeat 5] [--reruns 200]
+"""
+import argparse
+import ast
+import importlib.util
+import os
+import statistics
+import subprocess
+import sys
+import timeit
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# مفاتيح وهمية حتى يمكن إنشاء العملاء دون الاتصال بأي خدمة
+for name in ("OPENAI_API_KEY", "ANTHROPIC_API_KEY", "GOOGLE_API_KEY", "GOOGLE_CSE_ID"):
+    os.environ.setdefault(name, "benchmark")
+
+# ما كان app.py يستورده عند بدء كل عملية؛ بعضها (مثل bs4) لم يعد في requirements.txt
+# فيُتخطى إن لم يكن مثبتًا ويُذكر في النتيجة
+LEGACY_IMPORTS = (
+    "streamlit", "openai", "requests", "anthropic", "gtts", "dotenv",
+    "asyncio", "aiohttp", "bs4", "langchain_community.utilities",
+)
+
+
+def app_imports(path=os.path.join(ROOT, "app.py")):
+    """الوحدات التي يستوردها app.py في مستواه الأعلى، مقروءة من شجرة الكود حتى لا تتقادم القائمة"""
+    with open(path, encoding="utf-8") as file:
+        tree = ast.parse(file.read())
+    modules = []
+    for node in tree.body:
+        if isinstance(node, ast.Import):
+            names = [alias.name for alias in node.names]
+        elif isinstance(node, ast.ImportFrom) and node.module and not node.level:
+            names = [node.module]
+        else:
+            continue
+        modules.extend(name for name in names if name not in modules)
+    return tuple(modules)
+
+
+def installed(modules):
+    """الوحدات المثبتة والوحدات غير المثبتة (بحسب الحزمة الأعلى، دون استيرادها)"""
+    found, missing = [], []
+    for name in modules:
+        (found if importlib.util.find_spec(name.split(".")[0]) else missing).append(name)
+    return tuple(found), missing
+
+
+def cold_import(modules, repeat):
+    """زمن استيراد الوحدات في عملية جديدة (الوسيط بالثواني)"""
+    code = (
+        "import time, importlib\n"
+        "start = time.perf_counter()\n"
+        f"for name in {modules!r}:\n"
+        "    importlib.import_module(name)\n"
+        "print(time.perf_counter() - start)\n"
+    )
+    samples = []
+    for _ in range(repeat):
+        output = subprocess.run(
+            [sys.executable, "-c", code], cwd=ROOT, check=True,
+            capture_output=True, text=True
+        ).stdout
+        samples.append(float(output.strip().splitlines()[-1]))
+    return statistics.median(samples)
+
+
+def legacy_rerun():
+    # ما كان يتكرر في بداية كل إعادة تشغيل للسكربت
+    from dotenv import load_dotenv
+    import anthropic
+    from langchain_community.utilities import GoogleSearchAPIWrapper
+
+    load_dotenv()
+    anthropic.Anthropic(api_key=os.getenv("ANTHROPIC_API_KEY"))
+    GoogleSearchAPIWrapper(
+        google_api_key=os.getenv("GOOGLE_API_KEY"),
+        google_cse_id=os.getenv("GOOGLE_CSE_ID")
+    )
+
+
+def current_rerun():
+    from clients import get_anthropic_client, get_google_search
+
+    get_anthropic_client()
+    get_google_search()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=5, help="عدد العمليات الجديدة لكل قياس استيراد")
+    parser.add_argument("--reruns", type=int, default=200, help="عدد إعادات التشغيل المحاكاة")
+    args = parser.parse_args()
+
+    print("زمن الاستيراد البارد (الوسيط):")
+    for label, modules in (("قبل", LEGACY_IMPORTS), ("بعد", app_imports())):
+        modules, missing = installed(modules)
+        skipped = f"  (دون {', '.join(missing)}: غير مثبتة)" if missing else ""
+        try:
+            print(f"  {label}: {cold_import(modules, args.repeat) * 1000:8.1f} ms{skipped}")
+        except subprocess.CalledProcessError as e:
+            print(f"  {label}: تعذر القياس (مكتبة غير مثبتة؟)\n{e.stderr}")
+
+    print("تكلفة تهيئة العملاء في كل إعادة تشغيل:")
+    current_rerun()  # الإنشاء الأول يُحسب ضمن بدء التشغيل لا ضمن إعادة التشغيل
+    for label, rerun in (("قبل", legacy_rerun), ("بعد", current_rerun)):
+        seconds = timeit.timeit(rerun, number=args.reruns) / args.reruns
+        print(f"  {label}: {seconds * 1000:8.3f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,241 @@
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+##############################
+# إعدادات التخزين المؤقت الافتراضية
+##############################
+DEFAULT_PAGE_CACHE_PATH = os.path.join("cache", "pages.sqlite3")
+DEFAULT_PAGE_TTL = 24 * 60 * 60             # صلاحية النص المستخرج بالثواني (يوم)
+DEFAULT_PAGE_CACHE_BYTES = 64 * 1024 * 1024  # الحد الأقصى لحجم النصوص المخزنة
+
+DEFAULT_TTL = 60 * 60                        # صلاحية عناصر الذاكرة المؤقتة بالثواني
+DEFAULT_MAX_ENTRIES = 1024                   # أقصى عدد عناصر في الذاكرة المؤقتة
+
+# معاملات التتبع التي لا تغيّر محتوى الصفحة
+TRACKING_PARAMS = ("utm_", "fbclid", "gclid", "mc_cid", "mc_eid")
+
+
+def normalize_url(url):
+    """توحيد الرابط حتى تشترك الروابط المتكافئة في نفس المفتاح"""
+    parts = urlsplit(url.strip())
+    scheme = parts.scheme.lower()
+    host = (parts.hostname or "").lower()
+    if parts.port and not (
+        (scheme == "http" and parts.port == 80) or (scheme == "https" and parts.port == 443)
+    ):
+        host = f"{host}:{parts.port}"
+    path = parts.path.rstrip("/") or "/"
+    query = sorted(
+        (key, value) for key, value in parse_qsl(parts.query, keep_blank_values=True)
+        if not key.lower().startswith(TRACKING_PARAMS)
+    )
+    return urlunsplit((scheme, host, path, urlencode(query), ""))
+
+
+class PageCache:
+    """
+    تخزين مؤقت على القرص للنصوص المستخرجة من الصفحات باستخدام SQLite.
+    يدعم مدة صلاحية (TTL) وإزالة الأقدم استخدامًا (LRU) عند تجاوز الحجم،
+    ويمكن مشاركته بأمان بين عدة عمليات لخادم Streamlit عبر وضع WAL.
+    """
+
+    def __init__(self, path=DEFAULT_PAGE_CACHE_PATH, ttl=DEFAULT_PAGE_TTL,
+                 max_bytes=DEFAULT_PAGE_CACHE_BYTES):
+        self.path = path
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self._local = threading.local()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS pages ("
+                " key TEXT PRIMARY KEY, text TEXT NOT NULL, size INTEGER NOT NULL,"
+                " created_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS pages_accessed ON pages (accessed_at)")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS stats (name TEXT PRIMARY KEY, value INTEGER NOT NULL)"
+            )
+            conn.execute("INSERT OR IGNORE INTO stats VALUES ('hits', 0), ('misses', 0)")
+
+    def _connect(self):
+        # اتصال لكل خيط لأن اتصالات sqlite3 لا تُشارك بين الخيوط
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, url):
+        """إرجاع النص المخزن للرابط أو None إذا لم يوجد أو انتهت صلاحيته"""
+        key = normalize_url(url)
+        now = time.time()
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT text FROM pages WHERE key = ? AND created_at > ?",
+                (key, now - self.ttl),
+            ).fetchone()
+            if row is None:
+                conn.execute("UPDATE stats SET value = value + 1 WHERE name = 'misses'")
+                return None
+            conn.execute("UPDATE pages SET accessed_at = ? WHERE key = ?", (now, key))
+            conn.execute("UPDATE stats SET value = value + 1 WHERE name = 'hits'")
+            return row[0]
+
+    def set(self, url, text):
+        """حفظ نص الصفحة ثم إزالة الأقدم استخدامًا إذا تجاوز الحجم الحد المسموح"""
+        key = normalize_url(url)
+        now = time.time()
+        size = len(text.encode("utf-8"))
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute(
+                "INSERT OR REPLACE INTO pages VALUES (?, ?, ?, ?, ?)",
+                (key, text, size, now, now),
+            )
+            conn.execute("DELETE FROM pages WHERE created_at <= ?", (now - self.ttl,))
+            total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM pages").fetchone()[0]
+            if total > self.max_bytes:
+                excess = total - self.max_bytes
+                victims = []
+                for victim, victim_size in conn.execute(
+                    "SELECT key, size FROM pages ORDER BY accessed_at"
+                ):
+                    if excess <= 0:
+                        break
+                    victims.append((victim,))
+                    excess -= victim_size
+                conn.executemany("DELETE FROM pages WHERE key = ?", victims)
+
+    def stats(self):
+        """عدادات الإصابة والإخفاق وحجم المخزن"""
+        conn = self._connect()
+        counters = dict(conn.execute("SELECT name, value FROM stats"))
+        entries, size = conn.execute(
+            "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM pages"
+        ).fetchone()
+        lookups = counters["hits"] + counters["misses"]
+        return {
+            "hits": counters["hits"],
+            "misses": counters["misses"],
+            "hit_rate": counters["hits"] / lookups if lookups else 0.0,
+            "entries": entries,
+            "bytes": size,
+        }
+
+    def clear(self):
+        """حذف كل الصفحات المخزنة وتصفير العدادات"""
+        with self._connect() as conn:
+            conn.execute("DELETE FROM pages")
+            conn.execute("UPDATE stats SET value = 0")
+
+
+_MISSING = object()
+
+
+class SingleFlight:
+    """دمج الاستدعاءات المتزامنة لنفس المفتاح في استدعاء واحد يشارك الجميع نتيجته"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def do(self, key, fn):
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = self._calls[key] = Future()
+        if not leader:
+            return future.result()
+        try:
+            result = fn()
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                del self._calls[key]
+
+
+class TTLCache:
+    """
+    ذاكرة مؤقتة داخل العملية بمدة صلاحية وحد أقصى لعدد العناصر (LRU)،
+    آمنة للاستخدام من عدة خيوط، مع دمج الطلبات المتزامنة لنفس المفتاح.
+    """
+
+    def __init__(self, ttl=DEFAULT_TTL, max_entries=DEFAULT_MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self._flight = SingleFlight()
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None or entry[0] <= time.monotonic():
+                if entry is not None:
+                    del self._data[key]
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def get_or_load(self, key, loader):
+        """
+        إرجاع القيمة المخزنة أو تحميلها مرة واحدة مهما تعدد الطالبون.
+        لا تُخزَّن الأخطاء ولا القيمة None حتى تُعاد المحاولة في الطلب التالي.
+        """
+        value = self.get(key, _MISSING)
+        if value is not _MISSING:
+            return value
+        return self._flight.do(key, lambda: self._load(key, loader))
+
+    def _load(self, key, loader):
+        # قد يكون طلب سابق ملأ المفتاح بين فحص الذاكرة وبدء التحميل
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None and entry[0] > time.monotonic():
+                return entry[1]
+        value = loader()
+        if value is not None:
+            self.set(key, value)
+        return value
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "entries": len(self._data),
+            }
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
@@ -0,0 +1,186 @@
+import logging
+import os
+import threading
+
+from dotenv import load_dotenv
+
+from metrics import DEFAULT_HOST, metrics, serve
+
+logger = logging.getLogger(__name__)
+
+##############################
+# تهيئة المفاتيح والـ API
+# العملاء والموارد المشتركة كائنات وحيدة على مستوى العملية: لا تُستورد مكتباتها
+# الثقيلة إلا عند أول استخدام، وتبقى عبر كل إعادات تشغيل Streamlit لأن هذه الوحدة
+# لا يُعاد تنفيذها، ويمكن استدعاؤها من خيوط المهام الخلفية أيضًا.
+##############################
+load_dotenv()  # تحميل المتغيرات من ملف .env مرة واحدة لكل عملية
+
+OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
+ANTHROPIC_API_KEY = os.getenv("ANTHROPIC_API_KEY")
+GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
+GOOGLE_CSE_ID = os.getenv("GOOGLE_CSE_ID")
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN")    # يفتح صفحة القياسات عبر ?page=admin&token=...
+METRICS_PORT = os.getenv("METRICS_PORT")  # منفذ اختياري لعرض /metrics لـ Prometheus
+METRICS_HOST = os.getenv("METRICS_HOST", DEFAULT_HOST)  # 0.0.0.0 لكشفه خارج الجهاز (دون مصادقة)
+# عناوين ومسارات بديلة (مثل خوادم محلية في benchmarks/load.py)؛ Anthropic و OpenAI
+# يقرآن ANTHROPIC_BASE_URL و OPENAI_API_BASE من البيئة مباشرة
+GOOGLE_SEARCH_URL = os.getenv("GOOGLE_SEARCH_URL")
+PAGE_CACHE_PATH = os.getenv("PAGE_CACHE_PATH")
+LOGO_DIR = os.getenv("LOGO_DIR")
+TTS_URL = os.getenv("TTS_URL")       # خادم بديل لـ gTTS
+AUDIO_DIR = os.getenv("AUDIO_DIR")
+
+_lock = threading.Lock()
+_instances = {}
+
+
+def _singleton(name, factory):
+    instance = _instances.get(name)
+    if instance is None:
+        with _lock:
+            instance = _instances.get(name)
+            if instance is None:
+                instance = _instances[name] = factory()
+    return instance
+
+
+def _create_anthropic():
+    import anthropic
+    return anthropic.Anthropic(api_key=ANTHROPIC_API_KEY)
+
+
+def _create_openai():
+    import openai
+    openai.api_key = OPENAI_API_KEY
+    return openai
+
+
+def _create_google_search():
+    from search import CachedSearch, CustomSearchClient
+    if GOOGLE_SEARCH_URL:
+        client = CustomSearchClient(GOOGLE_SEARCH_URL, GOOGLE_API_KEY, GOOGLE_CSE_ID)
+    else:
+        from langchain_community.utilities import GoogleSearchAPIWrapper
+        client = GoogleSearchAPIWrapper(
+            google_api_key=GOOGLE_API_KEY,
+            google_cse_id=GOOGLE_CSE_ID
+        )
+    search = CachedSearch(client)
+    metrics.register_collector("search_cache", search.cache.stats)
+    return search
+
+
+def get_anthropic_client():
+    return _singleton("anthropic", _create_anthropic)
+
+
+def get_openai():
+    """وحدة openai بعد ضبط المفتاح (الإصدار 0.x يعتمد على إعدادات الوحدة)"""
+    return _singleton("openai", _create_openai)
+
+
+def get_google_search():
+    """بحث جوجل مع ذاكرة مؤقتة مشتركة بين كل الجلسات"""
+    return _singleton("google_search", _create_google_search)
+
+
+def _create_fetcher():
+    from cache import DEFAULT_PAGE_CACHE_PATH, PageCache
+    from fetcher import PooledFetcher
+    fetcher = PooledFetcher(cache=PageCache(PAGE_CACHE_PATH or DEFAULT_PAGE_CACHE_PATH))
+    metrics.register_collector("page_cache", fetcher.cache.stats)
+    return fetcher
+
+
+def _create_response_cache():
+    from cache import TTLCache
+    from llm import DEFAULT_RESPONSE_ENTRIES, DEFAULT_RESPONSE_TTL
+    cache = TTLCache(ttl=DEFAULT_RESPONSE_TTL, max_entries=DEFAULT_RESPONSE_ENTRIES)
+    metrics.register_collector("response_cache", cache.stats)
+    return cache
+
+
+def _create_logo_generator():
+    from logos import DEFAULT_IMAGE_DIR, LogoGenerator
+    return LogoGenerator(LOGO_DIR or DEFAULT_IMAGE_DIR)
+
+
+def _create_voiceover():
+    from voiceover import DEFAULT_AUDIO_DIR, AudioCache, HTTPSynthesizer, VoiceOver, gtts_synthesize
+    voiceover = VoiceOver(
+        synthesize=HTTPSynthesizer(TTS_URL) if TTS_URL else gtts_synthesize,
+        cache=AudioCache(AUDIO_DIR or DEFAULT_AUDIO_DIR),
+    )
+    metrics.register_collector("audio_cache", voiceover.cache.stats)
+    return voiceover
+
+
+def _create_job_executor():
+    from jobs import DEFAULT_QUEUE_LIMIT, DEFAULT_SESSION_LIMIT, DEFAULT_WORKERS, JobExecutor
+    executor = JobExecutor(
+        max_workers=int(os.getenv("JOB_WORKERS", DEFAULT_WORKERS)),
+        queue_limit=int(os.getenv("JOB_QUEUE_LIMIT", DEFAULT_QUEUE_LIMIT)),
+        session_limit=int(os.getenv("JOB_SESSION_LIMIT", DEFAULT_SESSION_LIMIT)),
+    )
+    metrics.register_collector("jobs", executor.stats)
+    return executor
+
+
+def _create_llm_router():
+    from router import AnthropicProvider, LLMRouter, OpenAIProvider
+    providers = []
+    if ANTHROPIC_API_KEY:
+        providers.append(AnthropicProvider(get_anthropic_client))
+    if OPENAI_API_KEY:
+        providers.append(OpenAIProvider(get_openai))
+    router = LLMRouter(providers)
+    metrics.register_collector("llm_router", router.stats)
+    return router
+
+
+def get_llm_router():
+    """موجّه طلبات النصوص: Claude أولًا ثم OpenAI احتياطيًا"""
+    return _singleton("llm_router", _create_llm_router)
+
+
+def get_fetcher():
+    """جالب مشترك بين كل الجلسات يعيد استخدام الاتصالات وذاكرة DNS"""
+    return _singleton("fetcher", _create_fetcher)
+
+
+def get_response_cache():
+    """ذاكرة مشتركة لردود Claude حتى لا تُعاد الطلبات المطابقة"""
+    return _singleton("response_cache", _create_response_cache)
+
+
+def get_logo_generator():
+    """مولد شعارات مشترك بخيوطه ومخزن صوره بين كل الجلسات"""
+    return _singleton("logo_generator", _create_logo_generator)
+
+
+def get_voiceover():
+    """التعليق الصوتي المشترك بخيوطه ومقاطعه المخزنة بين كل الجلسات"""
+    return _singleton("voiceover", _create_voiceover)
+
+
+def get_job_executor():
+    """منفذ المهام الخلفية المشترك؛ حدوده قابلة للضبط بمتغيرات البيئة JOB_*"""
+    return _singleton("job_executor", _create_job_executor)
+
+
+def _create_metrics_server():
+    if not METRICS_PORT:
+        return False
+    try:
+        return serve(metrics, int(METRICS_PORT), METRICS_HOST)
+    except OSError as e:
+        # المنفذ محجوز غالبًا لعملية Streamlit أخرى على نفس الجهاز: نتابع دون الخادم
+        # ونحفظ الإخفاق حتى لا يُعاد الربط (ويفشل) مع كل إعادة تشغيل للصفحة
+        logger.error("metrics server on %s:%s failed: %r", METRICS_HOST, METRICS_PORT, e)
+        return False
+
+
+def start_metrics_server():
+    """تشغيل خادم /metrics مرة واحدة لكل عملية إذا ضُبط METRICS_PORT"""
+    return _singleton("metrics_server", _create_metrics_server)
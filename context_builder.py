@@ -0,0 +1,115 @@
+import math
+import re
+from collections import Counter
+
+from search import normalize_query
+
+##############################
+# إعدادات بناء السياق الافتراضية
+##############################
+DEFAULT_CONTEXT_TOKENS = 1500   # ميزانية المحتوى المستخرج داخل الطلب بالتوكنات
+MIN_PASSAGE_CHARS = 40          # الفقرات الأقصر غالبًا قوائم أو أزرار
+DUPLICATE_THRESHOLD = 0.7       # نسبة التشابه (Jaccard) التي تعتبر بعدها الفقرة مكررة
+SHINGLE_SIZE = 3                # عدد الكلمات في كل مقطع عند مقارنة الفقرات
+
+# عبارات كاملة من لافتات المواقع وتذييلاتها (لا كلمات مفردة حتى لا تُستبعد فقرات
+# عن المنتج نفسه، مثل الكوكيز كمنتج أو design in التي تحتوي sign in)
+BOILERPLATE = (
+    "we use cookies", "this site uses cookies", "this website uses cookies",
+    "accept all cookies", "accept cookies", "cookie policy", "cookie settings",
+    "privacy policy", "all rights reserved", "subscribe to our newsletter",
+    "sign up for our newsletter", "enable javascript", "javascript is disabled",
+    "sign in to your account", "log in to your account",
+    "نستخدم ملفات تعريف الارتباط", "يستخدم هذا الموقع ملفات تعريف الارتباط",
+    "قبول جميع ملفات تعريف الارتباط", "نستخدم الكوكيز", "يستخدم هذا الموقع الكوكيز",
+    "سياسة الخصوصية", "جميع الحقوق محفوظة", "اشترك في النشرة", "اشترك في نشرتنا",
+    "تسجيل الدخول إلى حسابك", "سجل الدخول إلى حسابك",
+)
+
+_SENTENCE_END = re.compile(r"(?<=[.!?؟])\s+|\n+")
+_WORD = re.compile(r"\w+")
+# العبارة كاملة بين حدود كلمات، مع السماح بواو أو فاء العطف الملتصقة في العربية
+_BOILERPLATE = re.compile(
+    r"(?<!\w)[وف]?(?:" + "|".join(re.escape(phrase) for phrase in BOILERPLATE) + r")(?!\w)",
+    re.IGNORECASE
+)
+
+
+def estimate_tokens(text):
+    """تقدير تقريبي لعدد التوكنات (حرف إلى ثلاثة أحرف عربية لكل توكن)"""
+    return math.ceil(len(text) / 3)
+
+
+def tokenize(text):
+    return _WORD.findall(normalize_query(text))
+
+
+def split_passages(text, min_chars=MIN_PASSAGE_CHARS):
+    """تقسيم الصفحة إلى فقرات وجمل واستبعاد القصير والثابت منها"""
+    passages = []
+    for passage in _SENTENCE_END.split(text):
+        passage = " ".join(passage.split())
+        if len(passage) < min_chars:
+            continue
+        if _BOILERPLATE.search(passage):
+            continue
+        passages.append(passage)
+    return passages
+
+
+def _shingles(tokens, size=SHINGLE_SIZE):
+    if len(tokens) < size:
+        return {tuple(tokens)}
+    return {tuple(tokens[i:i + size]) for i in range(len(tokens) - size + 1)}
+
+
+def deduplicate(passages, threshold=DUPLICATE_THRESHOLD):
+    """استبعاد الفقرات شبه المكررة بمقارنة مقاطع الكلمات (shingles)"""
+    kept, seen = [], []
+    for passage in passages:
+        shingles = _shingles(tokenize(passage))
+        if any(len(shingles & other) / len(shingles | other) >= threshold for other in seen):
+            continue
+        kept.append(passage)
+        seen.append(shingles)
+    return kept
+
+
+def rank(passages, query, k1=1.5, b=0.75):
+    """ترتيب الفقرات حسب صلتها بالاستعلام باستخدام BM25"""
+    query_terms = set(tokenize(query))
+    docs = [Counter(tokenize(passage)) for passage in passages]
+    if not docs:
+        return []
+    avg_len = sum(sum(doc.values()) for doc in docs) / len(docs) or 1
+    doc_freq = Counter(term for doc in docs for term in doc if term in query_terms)
+
+    def score(doc):
+        length = sum(doc.values())
+        total = 0.0
+        for term in query_terms:
+            tf = doc.get(term, 0)
+            if not tf:
+                continue
+            idf = math.log(1 + (len(docs) - doc_freq[term] + 0.5) / (doc_freq[term] + 0.5))
+            total += idf * tf * (k1 + 1) / (tf + k1 * (1 - b + b * length / avg_len))
+        return total
+
+    order = sorted(range(len(passages)), key=lambda i: (-score(docs[i]), i))
+    return [passages[i] for i in order]
+
+
+def build_context(pages, query, token_budget=DEFAULT_CONTEXT_TOKENS):
+    """
+    بناء المحتوى المستخرج للطلب: تقسيم الصفحات إلى فقرات، حذف المكرر،
+    ترتيبها حسب الصلة بالمنتج، ثم أخذ الأفضل حتى تمتلئ ميزانية التوكنات.
+    """
+    passages = deduplicate([p for page in pages for p in split_passages(page)])
+    selected, used = [], 0
+    for passage in rank(passages, query):
+        cost = estimate_tokens(passage)
+        if used + cost > token_budget:
+            continue
+        selected.append(passage)
+        used += cost
+    return "\n".join(f"- {passage}" for passage in selected)
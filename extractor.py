@@ -0,0 +1,176 @@
+import codecs
+import re
+import time
+from html.parser import HTMLParser
+
+from metrics import metrics
+
+##############################
+# إعدادات الاستخراج الافتراضية
+##############################
+DEFAULT_PARAGRAPHS = 5           # عدد الفقرات المطلوبة من كل صفحة
+DEFAULT_MAX_CHARS = 1500         # أقصى طول للنص المستخرج
+DEFAULT_MAX_BYTES = 512 * 1024   # التوقف عن التحميل بعد هذا الحجم مهما كان
+DEFAULT_CHUNK_SIZE = 16 * 1024   # حجم كل دفعة تُقرأ من الاستجابة
+SNIFF_BYTES = 4096               # أول جزء من الصفحة يُبحث فيه عن وسم meta للترميز
+
+# <meta charset="..."> أو <meta http-equiv="Content-Type" content="text/html; charset=...">
+_META_CHARSET = re.compile(rb"<meta[^>]+charset\s*=\s*[\"']?\s*([\w.:-]+)", re.IGNORECASE)
+
+# وسوم لا يُعرض نصها
+_SKIPPED_TAGS = {"script", "style", "noscript", "template", "svg"}
+# وسوم كتلية تغلق الفقرة المفتوحة ضمنيًا كما في HTML
+_BLOCK_TAGS = {
+    "p", "div", "section", "article", "aside", "header", "footer", "nav", "main",
+    "ul", "ol", "table", "form", "h1", "h2", "h3", "h4", "h5", "h6",
+    "blockquote", "pre", "hr", "figure",
+}
+
+
+class ParagraphExtractor(HTMLParser):
+    """
+    مستخرج فقرات تدريجي: يُغذّى بأجزاء HTML أولًا بأول دون بناء شجرة DOM،
+    ويجمع نص وسوم <p> حتى يكتمل عدد الفقرات أو الحد الأقصى للأحرف.
+    """
+
+    def __init__(self, limit=DEFAULT_PARAGRAPHS, max_chars=DEFAULT_MAX_CHARS):
+        super().__init__(convert_charrefs=True)
+        self.limit = limit
+        self.max_chars = max_chars
+        self.paragraphs = []
+        self._current = None
+        self._skip_depth = 0
+        self._chars = 0
+
+    @property
+    def done(self):
+        return len(self.paragraphs) >= self.limit or self._chars >= self.max_chars
+
+    def handle_starttag(self, tag, attrs):
+        if tag in _SKIPPED_TAGS:
+            self._skip_depth += 1
+        elif tag in _BLOCK_TAGS:
+            self._close_paragraph()
+            if tag == "p" and not self.done:
+                self._current = []
+
+    def handle_startendtag(self, tag, attrs):
+        if tag in _BLOCK_TAGS:
+            self._close_paragraph()
+
+    def handle_endtag(self, tag):
+        if tag in _SKIPPED_TAGS:
+            self._skip_depth = max(0, self._skip_depth - 1)
+        elif tag in _BLOCK_TAGS:
+            self._close_paragraph()
+
+    def handle_data(self, data):
+        if self._current is not None and not self._skip_depth:
+            self._current.append(data)
+            self._chars += len(data)
+
+    def _close_paragraph(self):
+        if self._current is None:
+            return
+        self.paragraphs.append("".join(self._current))
+        self._chars += 1  # فاصل السطر بين الفقرات
+        self._current = None
+
+    def close(self):
+        super().close()
+        self._close_paragraph()
+
+    def text(self):
+        return "\n".join(self.paragraphs[:self.limit])[:self.max_chars]
+
+
+def is_html(content_type):
+    """قبول الصفحات بدون نوع محدد أو من نوع HTML فقط"""
+    content_type = (content_type or "").split(";")[0].strip().lower()
+    return not content_type or content_type in ("text/html", "application/xhtml+xml")
+
+
+def extract_paragraphs(html, limit=DEFAULT_PARAGRAPHS, max_chars=DEFAULT_MAX_CHARS):
+    """استخراج أول الفقرات من صفحة HTML كاملة"""
+    extractor = ParagraphExtractor(limit, max_chars)
+    extractor.feed(html)
+    extractor.close()
+    return extractor.text()
+
+
+def _valid_utf8(data):
+    try:
+        data.decode("utf-8")
+    except UnicodeDecodeError as e:
+        # حرف مقطوع في نهاية الدفعة لا يعني أن الترميز ليس UTF-8
+        return e.start >= len(data) - 3 and e.reason == "unexpected end of data"
+    return True
+
+
+def sniff_encoding(charset, head):
+    """
+    ترميز الصفحة: من ترويسة Content-Type، وإلا من وسم meta في أول SNIFF_BYTES،
+    وإلا UTF-8 إن كانت صالحة، وإلا بالكشف التلقائي كما يفعل response.text().
+    """
+    candidates = [charset]
+    match = _META_CHARSET.search(head[:SNIFF_BYTES])
+    if match:
+        candidates.append(match.group(1).decode("ascii", "ignore"))
+    for candidate in candidates:
+        if not candidate:
+            continue
+        try:
+            return codecs.lookup(candidate).name
+        except LookupError:
+            continue
+    if _valid_utf8(head):
+        return "utf-8"
+    from charset_normalizer import from_bytes  # يأتي مع aiohttp
+
+    best = from_bytes(head).best()
+    return best.encoding if best is not None else "utf-8"
+
+
+async def read_paragraphs(response, limit=DEFAULT_PARAGRAPHS, max_chars=DEFAULT_MAX_CHARS,
+                          max_bytes=DEFAULT_MAX_BYTES, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    قراءة استجابة aiohttp على دفعات واستخراج الفقرات أثناء التحميل،
+    مع التوقف وإغلاق الاتصال بمجرد اكتمال النص أو بلوغ الحد الأقصى للحجم.
+    """
+    decoder = None
+    head = b""
+    extractor = ParagraphExtractor(limit, max_chars)
+    received = 0
+    parsing = 0.0  # زمن التحليل وحده دون انتظار الشبكة
+    complete = True
+    async for chunk in response.content.iter_chunked(chunk_size):
+        received += len(chunk)
+        start = time.perf_counter()
+        if decoder is None:
+            # الدفعة الأولى قد تكون أي جزء وصل حتى الآن؛ نجمع SNIFF_BYTES كاملة (أو الصفحة
+            # كلها إن كانت أقصر) قبل تحديد الترميز حتى لا يفوتنا وسم meta في دفعة لاحقة
+            head += chunk
+            if len(head) < SNIFF_BYTES:
+                continue
+            decoder = codecs.getincrementaldecoder(sniff_encoding(response.charset, head))(errors="replace")
+            chunk, head = head, b""
+        extractor.feed(decoder.decode(chunk))
+        parsing += time.perf_counter() - start
+        if extractor.done or received >= max_bytes:
+            complete = False
+            break
+    start = time.perf_counter()
+    if decoder is None and head:
+        # صفحة أقصر من SNIFF_BYTES
+        decoder = codecs.getincrementaldecoder(sniff_encoding(response.charset, head))(errors="replace")
+        extractor.feed(decoder.decode(head))
+    if complete and decoder is not None:
+        extractor.feed(decoder.decode(b"", final=True))
+    else:
+        # لا فائدة من بقية الصفحة؛ إغلاق الاتصال بدل تحميلها
+        response.close()
+    extractor.close()
+    parsing += time.perf_counter() - start
+    metrics.observe("stage_seconds", parsing, stage="html_parse")
+    metrics.increment("page_bytes_total", received)
+    return extractor.text()
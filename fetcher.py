@@ -0,0 +1,148 @@
+import asyncio
+import atexit
+import threading
+import time
+from collections import namedtuple
+
+from extractor import is_html, read_paragraphs
+from metrics import metrics
+
+##############################
+# إعدادات الجلب الافتراضية
+##############################
+DEFAULT_TIMEOUT = 10          # مهلة الطلب الواحد بالثواني
+DEFAULT_LIMIT = 100           # أقصى عدد اتصالات مفتوحة في المجمع
+DEFAULT_LIMIT_PER_HOST = 4    # أقصى عدد اتصالات متزامنة لنفس الموقع
+DEFAULT_DNS_TTL = 300         # مدة الاحتفاظ بنتائج DNS بالثواني
+DEFAULT_KEEPALIVE = 30        # مدة إبقاء الاتصال الخامل مفتوحًا بالثواني
+DEFAULT_DEADLINE = 4          # المهلة الإجمالية لجمع الصفحات بالثواني
+DEFAULT_MIN_PAGES = 5         # عدد الصفحات الكافية للمتابعة دون انتظار البقية
+
+
+class PageResult(namedtuple("PageResult", ["url", "text", "error"])):
+    """نتيجة جلب صفحة: النص المستخرج أو رسالة الخطأ"""
+    __slots__ = ()
+
+    @property
+    def ok(self):
+        return self.error is None and bool(self.text.strip())
+
+
+class PooledFetcher:
+    """
+    جالب صفحات بجلسة aiohttp واحدة طويلة العمر.
+    يعمل على حلقة أحداث خاصة في خيط منفصل حتى تبقى الاتصالات (keep-alive)
+    وذاكرة DNS صالحة بين استدعاءات Streamlit المختلفة.
+    """
+
+    def __init__(self, timeout=DEFAULT_TIMEOUT, limit=DEFAULT_LIMIT,
+                 limit_per_host=DEFAULT_LIMIT_PER_HOST, dns_ttl=DEFAULT_DNS_TTL,
+                 keepalive=DEFAULT_KEEPALIVE, cache=None):
+        self.timeout = timeout
+        self.limit = limit
+        self.limit_per_host = limit_per_host
+        self.dns_ttl = dns_ttl
+        self.keepalive = keepalive
+        self.cache = cache  # PageCache اختياري لتجنب إعادة جلب الصفحات الشائعة
+
+        self._session = None
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(
+            target=self._loop.run_forever, name="fetcher-loop", daemon=True
+        )
+        self._thread.start()
+        atexit.register(self.close)
+
+    async def _get_session(self):
+        # تُنشأ الجلسة داخل حلقة الجالب لأنها مرتبطة بالحلقة التي أُنشئت فيها
+        if self._session is None or self._session.closed:
+            import aiohttp  # استيراد متأخر: aiohttp ثقيل ولا تحتاجه إلا صفحة المستشار
+            connector = aiohttp.TCPConnector(
+                limit=self.limit,
+                limit_per_host=self.limit_per_host,
+                use_dns_cache=True,
+                ttl_dns_cache=self.dns_ttl,
+                keepalive_timeout=self.keepalive,
+            )
+            self._session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=aiohttp.ClientTimeout(total=self.timeout),
+            )
+        return self._session
+
+    async def fetch(self, url):
+        """جلب محتوى صفحة واحدة (يُستدعى داخل حلقة الجالب)"""
+        start = time.perf_counter()
+        page = await self._fetch(url)
+        # الطلبات الملغاة بعد اكتمال العدد الكافي لا تصل إلى هنا فلا تُحسب أخطاء
+        metrics.observe("stage_seconds", time.perf_counter() - start, stage="page_fetch")
+        if not page.ok:
+            metrics.increment("errors_total", stage="page_fetch")
+        return page
+
+    async def _fetch(self, url):
+        try:
+            if self.cache is not None:
+                text = await asyncio.to_thread(self.cache.get, url)
+                if text is not None:
+                    return PageResult(url, text, None)
+            session = await self._get_session()
+            async with session.get(url) as response:
+                if response.status == 200:
+                    if not is_html(response.headers.get("Content-Type")):
+                        return PageResult(url, "", f"⚠️ نوع المحتوى غير مدعوم في {url}")
+                    page = PageResult(url, await read_paragraphs(response), None)
+                    if self.cache is not None and page.ok:
+                        await asyncio.to_thread(self.cache.set, url, page.text)
+                    return page
+                else:
+                    return PageResult(url, "", f"❌ لم يتمكن من الوصول إلى {url} - حالة HTTP: {response.status}")
+        except asyncio.TimeoutError:
+            return PageResult(url, "", f"⏳ انتهت مهلة الاتصال بالموقع: {url}")
+        except Exception as e:
+            return PageResult(url, "", f"⚠️ خطأ أثناء جلب المحتوى من {url}: {e}")
+
+    async def _fetch_all(self, urls, min_pages=None, deadline=None):
+        """
+        جمع الصفحات حتى نحصل على min_pages صفحة ناجحة أو تنتهي المهلة،
+        ثم إلغاء الطلبات المتأخرة. تُعاد الصفحات الناجحة فقط بترتيب الروابط.
+        """
+        tasks = {asyncio.ensure_future(self.fetch(url)): i for i, url in enumerate(urls) if url}
+        pending = set(tasks)
+        pages = {}
+        end = self._loop.time() + deadline if deadline else None
+        try:
+            while pending:
+                timeout = None if end is None else max(0, end - self._loop.time())
+                done, pending = await asyncio.wait(
+                    pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED
+                )
+                if not done:
+                    break  # انتهت المهلة الإجمالية
+                for task in done:
+                    page = task.result()
+                    if page.ok:
+                        pages[tasks[task]] = page
+                if min_pages and len(pages) >= min_pages:
+                    break
+        finally:
+            for task in pending:
+                task.cancel()
+        return [pages[i] for i in sorted(pages)]
+
+    def run(self, coro):
+        """تشغيل coroutine على حلقة الجالب وانتظار نتيجتها من أي خيط"""
+        return asyncio.run_coroutine_threadsafe(coro, self._loop).result()
+
+    def fetch_all(self, urls, min_pages=None, deadline=None):
+        """جلب مجموعة روابط بالتوازي عبر الجلسة المشتركة وإرجاع الصفحات الناجحة"""
+        return self.run(self._fetch_all(urls, min_pages, deadline))
+
+    def close(self):
+        """إغلاق الجلسة وإيقاف حلقة الجالب"""
+        if not self._loop.is_running():
+            return
+        if self._session is not None and not self._session.closed:
+            self.run(self._session.close())
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join(timeout=5)
@@ -0,0 +1,146 @@
+from clients import get_llm_router, get_logo_generator, get_response_cache, get_voiceover
+from llm import complete, stream_message
+from logos import DEFAULT_VARIANTS
+from metrics import metrics
+
+##############################
+# توليد المحتوى التسويقي (مشترك بين واجهة Streamlit ووضع الدفعات)
+##############################
+CONTENT_TYPES = [
+    "نشر خبر", "إعلان نصي", "سرد قصصي",
+    "سرد تحفيزي", "محتوى تفصيلي", "محتوى مختصر", "أخرى"
+]
+LOGO_STYLES = ["شعار نصي", "شعار حرفي", "شعار رمزي", "شخصية", "لا شيء"]
+RECOMMENDATION_MAX_TOKENS = 50
+TEXT_MAX_TOKENS = 1024
+
+
+def generate_logo_prompt(product_name, style_choice, description):
+    """إنشاء نص لطلب تصميم الشعار"""
+    if style_choice == "شعار نصي":
+        return (
+            f"Design a clean and elegant text-based logo for the brand '{product_name}'. "
+            f"The logo should focus on text with a sleek and readable style. {description if description else ''}"
+        )
+    elif style_choice == "شعار حرفي":
+        return (
+            f"Create a professional logo using the initials of the brand name '{product_name}'. "
+            f"The design should reflect the identity of the brand. {description if description else ''}"
+        )
+    elif style_choice == "شعار رمزي":
+        return (
+            f"Design a unique symbolic logo for the brand '{product_name}'. "
+            f"Use icons or symbols that represent the concept of the brand effectively. {description if description else ''}"
+        )
+    elif style_choice == "شخصية":
+        return (
+            f"Create a character-based logo representing the brand '{product_name}'. "
+            f"The character should be unique and visually aligned with the brand's identity. {description if description else ''}"
+        )
+    else:
+        return (
+            f"Design an innovative logo for the product or brand named '{product_name}'. {description if description else ''}"
+        )
+
+
+def recommendation_prompt(description, content_options):
+    return (
+        f"أنت خبير في التسويق، بناءً على وصف المنتج التالي، "
+        f"اختر أفضل نوع تسويق يناسبه من القائمة المقدمة:\n"
+        f"وصف المنتج: {description}\n"
+        f"الخيارات المتاحة: {', '.join(content_options)}\n"
+        f"يرجى تقديم النوع الأنسب فقط دون تفاصيل إضافية."
+    )
+
+
+@metrics.timed("recommendation")
+def get_recommended_marketing_type(description, content_options, raise_errors=False):
+    prompt = recommendation_prompt(description, content_options)
+    try:
+        response = complete(
+            get_llm_router(), prompt,
+            max_tokens=RECOMMENDATION_MAX_TOKENS, cache=get_response_cache()
+        )
+        if response:
+            return response.strip()
+        else:
+            return "تعذر تحديد النوع المناسب، الرجاء التحقق من المدخلات."
+    except Exception as e:
+        if raise_errors:
+            raise
+        metrics.increment("errors_total", stage="recommendation")
+        return f"حدث خطأ أثناء التوصية: {e}"
+
+
+def text_prompt(marketing_field, target_audience, content_type, event, comments):
+    return (
+        f"أجب كخبير تسويق. هدفك إنشاء نص تسويقي جذاب. "
+        f"- مجال التسويق: {marketing_field}\n"
+        f"- الجمهور المستهدف: {', '.join(target_audience) if target_audience else 'غير محدد'}\n"
+        f"- نوع المحتوى التسويقي: {content_type}\n"
+        f"- المناسبة: {event if event != 'لا شيء' else 'لا توجد مناسبة'}\n"
+        f"- الملاحظات: {comments if comments else 'لا توجد ملاحظات'}\n"
+    )
+
+
+@metrics.timed("model_text")
+def model_text(marketing_field, target_audience, content_type, event, comments, raise_errors=False):
+    user_message = text_prompt(marketing_field, target_audience, content_type, event, comments)
+    try:
+        response = complete(
+            get_llm_router(), user_message,
+            max_tokens=TEXT_MAX_TOKENS, cache=get_response_cache()
+        )
+        if response:
+            return response
+        else:
+            return "تعذر توليد النص التسويقي."
+    except Exception as e:
+        if raise_errors:
+            raise
+        metrics.increment("errors_total", stage="model_text")
+        return f"حدث خطأ أثناء توليد النص: {e}"
+
+
+def model_text_stream(marketing_field, target_audience, content_type, event, comments):
+    """نفس model_text لكن يُرجع أجزاء النص فور وصولها"""
+    user_message = text_prompt(marketing_field, target_audience, content_type, event, comments)
+    return stream_message(
+        get_llm_router(), user_message,
+        max_tokens=TEXT_MAX_TOKENS, cache=get_response_cache()
+    )
+
+
+##############################
+# مهام خلفية لصفحات الواجهة (انظر jobs.JobExecutor)
+##############################
+@metrics.timed("generate_image")
+def run_logo_generation(job, prompt):
+    """مهمة خلفية: توليد نسخ الشعار"""
+    return get_logo_generator().generate(prompt, n=DEFAULT_VARIANTS)
+
+
+def run_recommendation(job, description, content_options):
+    """مهمة خلفية: التوصية بنوع المحتوى"""
+    return get_recommended_marketing_type(description, content_options)
+
+
+@metrics.timed("model_text")
+def run_model_text(job, marketing_field, target_audience, content_type, event, comments):
+    """مهمة خلفية: توليد النص التسويقي مع تحديث النص الجزئي أثناء التدفق"""
+    for chunk in model_text_stream(marketing_field, target_audience, content_type, event, comments):
+        job.partial += chunk
+    return job.partial or "تعذر توليد النص التسويقي."
+
+
+@metrics.timed("voiceover")
+def run_voiceover(job, text):
+    """
+    مهمة خلفية: التعليق الصوتي؛ job.partial قائمة أصوات المقاطع الجاهزة بالترتيب،
+    والنتيجة الصوت كاملًا (إطارات MP3 تُلصق ببعضها مباشرة). الأصوات تُحفظ في المهمة
+    نفسها لا كمسارات، فلا تتأثر الصفحة بإزالة الذاكرة المؤقتة للملفات.
+    """
+    job.partial = []
+    for audio in get_voiceover().stream(text, audio=True):
+        job.partial.append(audio)
+    return b"".join(job.partial)
@@ -0,0 +1,105 @@
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+##############################
+# إعدادات المهام الافتراضية
+##############################
+DEFAULT_WORKERS = 8             # عدد المهام التي تعمل في نفس الوقت
+DEFAULT_QUEUE_LIMIT = 32        # أقصى عدد مهام تنتظر دورها
+DEFAULT_SESSION_LIMIT = 3       # أقصى عدد مهام غير منتهية لكل جلسة
+DEFAULT_RESULT_TTL = 15 * 60    # مدة الاحتفاظ بنتيجة المهمة بعد انتهائها بالثواني
+
+PENDING, RUNNING, DONE, FAILED = "pending", "running", "done", "failed"
+
+
+class JobQueueFull(Exception):
+    """لا مكان لمهمة جديدة: الطابور ممتلئ أو تجاوزت الجلسة حدها"""
+
+
+class Job:
+    """
+    مهمة في الخلفية. تستطيع الدالة المنفذة تحديث stage و partial أثناء العمل
+    حتى تعرض الصفحة التقدم والنص الجزئي في كل إعادة تشغيل.
+    """
+
+    def __init__(self, session_id):
+        self.id = uuid.uuid4().hex
+        self.session_id = session_id
+        self.state = PENDING
+        self.stage = None
+        self.partial = ""
+        self.result = None
+        self.error = None
+        self.created_at = time.monotonic()
+        self.finished_at = None
+
+    @property
+    def done(self):
+        return self.state in (DONE, FAILED)
+
+
+class JobExecutor:
+    """
+    منفذ مهام بعدد محدود من الخيوط وطابور محدود. تبقى المهام تعمل مهما أعاد
+    Streamlit تشغيل السكربت، وتستعلم كل جلسة عن مهمتها برقمها.
+    """
+
+    def __init__(self, max_workers=DEFAULT_WORKERS, queue_limit=DEFAULT_QUEUE_LIMIT,
+                 session_limit=DEFAULT_SESSION_LIMIT, result_ttl=DEFAULT_RESULT_TTL):
+        self.max_workers = max_workers
+        self.queue_limit = queue_limit
+        self.session_limit = session_limit
+        self.result_ttl = result_ttl
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="job")
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def submit(self, session_id, fn, *args, **kwargs):
+        """
+        جدولة fn(job, *args, **kwargs) وإرجاع رقم المهمة.
+        يرفع JobQueueFull بدل الانتظار عندما يمتلئ الطابور (ضغط عكسي).
+        """
+        with self._lock:
+            self._purge()
+            active = [job for job in self._jobs.values() if not job.done]
+            if len(active) >= self.max_workers + self.queue_limit:
+                raise JobQueueFull("الطابور ممتلئ")
+            if sum(job.session_id == session_id for job in active) >= self.session_limit:
+                raise JobQueueFull("لديك طلبات قيد التنفيذ بالفعل")
+            job = Job(session_id)
+            self._jobs[job.id] = job
+        self._pool.submit(self._run, job, fn, args, kwargs)
+        return job.id
+
+    def get(self, job_id):
+        """المهمة برقمها أو None إذا انتهت صلاحيتها أو لم توجد"""
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def stats(self):
+        with self._lock:
+            states = [job.state for job in self._jobs.values()]
+        return {state: states.count(state) for state in (PENDING, RUNNING, DONE, FAILED)}
+
+    def _run(self, job, fn, args, kwargs):
+        job.state = RUNNING
+        try:
+            job.result = fn(job, *args, **kwargs)
+            state = DONE
+        except Exception as e:
+            job.error = e
+            state = FAILED
+        # وقت الانتهاء قبل الحالة حتى لا يرى _purge مهمة منتهية بلا وقت
+        job.finished_at = time.monotonic()
+        job.state = state
+
+    def _purge(self):
+        now = time.monotonic()
+        expired = [
+            job_id for job_id, job in self._jobs.items()
+            if job.done and now - job.finished_at > self.result_ttl
+        ]
+        for job_id in expired:
+            del self._jobs[job_id]
@@ -0,0 +1,248 @@
+import hashlib
+import json
+import logging
+import threading
+import time
+from collections import namedtuple
+
+from metrics import metrics
+
+DEFAULT_MODEL = "claude-3-5-sonnet-20241022"
+DEFAULT_RESPONSE_TTL = 24 * 60 * 60   # صلاحية الردود المخزنة بالثواني
+DEFAULT_RESPONSE_ENTRIES = 512        # أقصى عدد ردود مخزنة
+
+logger = logging.getLogger(__name__)
+
+
+class StreamStats:
+    """توقيتات التوليد المتدفق: زمن أول كلمة والزمن الإجمالي بالثواني"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.first_token_at = None
+        self.finished_at = None
+
+    @property
+    def time_to_first_token(self):
+        if self.first_token_at is None:
+            return None
+        return self.first_token_at - self.started
+
+    @property
+    def total_time(self):
+        if self.finished_at is None:
+            return None
+        return self.finished_at - self.started
+
+
+class CachedPrompt(namedtuple("CachedPrompt", "prefix suffix")):
+    """
+    طلب مقسوم إلى بادئة ثابتة بين الطلبات (أمثلة وتعليمات) ولاحقة متغيرة،
+    حتى يخزن المزود معالجة البادئة ولا يحاسب عليها كاملة في كل مرة.
+    """
+
+    def __str__(self):
+        return self.prefix + self.suffix
+
+
+def response_key(model, prompt, **params):
+    """مفتاح الرد المخزن: بصمة النموذج والنص ومعاملات التوليد"""
+    payload = json.dumps(
+        {"model": model, "prompt": prompt, "params": params},
+        ensure_ascii=False, sort_keys=True
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def record_usage(model, usage):
+    """
+    تسجيل توكنات المدخلات والمخرجات من حقل usage في رد Anthropic.
+    input_tokens لا تشمل توكنات البادئة المقروءة من الذاكرة (cache_read) أو المكتوبة فيها (cache_write).
+    """
+    if usage is None:
+        return
+    cache_read = getattr(usage, "cache_read_input_tokens", None) or 0
+    cache_write = getattr(usage, "cache_creation_input_tokens", None) or 0
+    metrics.increment("llm_tokens_total", usage.input_tokens, model=model, kind="input")
+    metrics.increment("llm_tokens_total", usage.output_tokens, model=model, kind="output")
+    metrics.increment("llm_tokens_total", cache_read, model=model, kind="cache_read")
+    metrics.increment("llm_tokens_total", cache_write, model=model, kind="cache_write")
+    logger.info(
+        "usage %s: input=%d cached=%d cache_write=%d output=%d", model,
+        usage.input_tokens, cache_read, cache_write, usage.output_tokens,
+    )
+
+
+def complete(router, prompt, max_tokens=1024, cache=None):
+    """
+    توليد نص كامل عبر الموجّه (router.LLMRouter). عند تمرير cache (TTLCache)
+    تُخدم الطلبات المكررة من الذاكرة وينتظر الطلب المتزامن المطابق نفس الاستدعاء.
+    """
+    def call():
+        return router.complete(prompt, max_tokens=max_tokens) or None
+
+    if cache is None:
+        return call()
+    return cache.get_or_load(response_key(router.model, prompt, max_tokens=max_tokens), call)
+
+
+class _SharedStream:
+    """
+    تدفق واحد يتابعه عدة طالبين: القائد يضيف الأجزاء، والتابعون يقرؤونها
+    من البداية ثم ينتظرون الجديد حتى ينتهي التدفق أو يفشل.
+    """
+
+    def __init__(self):
+        self.chunks = []
+        self.followers = 0
+        self.done = False
+        self.error = None
+        self._cond = threading.Condition()
+
+    def append(self, chunk):
+        with self._cond:
+            self.chunks.append(chunk)
+            self._cond.notify_all()
+
+    def finish(self, error=None):
+        with self._cond:
+            self.done = True
+            self.error = error
+            self._cond.notify_all()
+
+    def follow(self):
+        index = 0
+        while True:
+            with self._cond:
+                while index >= len(self.chunks) and not self.done:
+                    self._cond.wait()
+                chunks = self.chunks[index:]
+                index += len(chunks)
+                if not chunks:
+                    if self.error is not None:
+                        raise self.error
+                    return
+            yield from chunks
+
+
+_streams = {}
+_streams_lock = threading.Lock()
+
+
+def _join_stream(key):
+    """(التدفق المشترك للمفتاح، هل المستدعي هو القائد)"""
+    with _streams_lock:
+        shared = _streams.get(key)
+        if shared is not None:
+            shared.followers += 1
+            return shared, False
+        shared = _streams[key] = _SharedStream()
+        return shared, True
+
+
+def _publish(upstream, shared, key, cache):
+    """إكمال التدفق للتابعين وتخزين الرد كاملًا ثم إزالة التدفق المشترك"""
+    try:
+        for text in upstream:
+            shared.append(text)
+    except Exception as e:
+        shared.finish(e)
+    else:
+        if shared.chunks:
+            cache.set(key, "".join(shared.chunks))
+        shared.finish()
+    finally:
+        _forget(key, shared)
+
+
+def _forget(key, shared):
+    with _streams_lock:
+        if _streams.get(key) is shared:
+            del _streams[key]
+
+
+def stream_message(router, prompt, max_tokens=1024, stats=None, cache=None):
+    """
+    توليد نص عبر الموجّه وإرجاع أجزائه أولًا بأول فور وصولها.
+    إذا وُجد الرد في cache يُرجع كاملًا دفعة واحدة، وإلا يُخزَّن بعد اكتمال التدفق.
+    الطلبات المتزامنة المطابقة تتابع تدفق الطلب الأول بدل إرسال طلب جديد.
+    """
+    stats = stats if stats is not None else StreamStats()
+    model = router.model
+    key = response_key(model, prompt, max_tokens=max_tokens)
+    try:
+        cached = cache.get(key) if cache is not None else None
+        if cached is not None:
+            stats.first_token_at = time.perf_counter()
+            yield cached
+            return
+        if cache is None:
+            chunks = router.stream(prompt, max_tokens=max_tokens)
+        else:
+            shared, leader = _join_stream(key)
+            chunks = _lead(router, prompt, max_tokens, shared, key, cache) if leader else shared.follow()
+        for text in chunks:
+            if stats.first_token_at is None:
+                stats.first_token_at = time.perf_counter()
+            yield text
+    finally:
+        stats.finished_at = time.perf_counter()
+        if stats.first_token_at is not None:
+            metrics.observe("llm_ttft_seconds", stats.time_to_first_token, model=model)
+        logger.info(
+            "stream %s: ttft=%s total=%.2fs", model,
+            f"{stats.time_to_first_token:.2f}s" if stats.first_token_at else "-",
+            stats.total_time,
+        )
+
+
+def _lead(router, prompt, max_tokens, shared, key, cache):
+    """تدفق القائد: كل جزء يصل يُنشر للتابعين أيضًا"""
+    upstream = router.stream(prompt, max_tokens=max_tokens)
+    try:
+        for text in upstream:
+            shared.append(text)
+            yield text
+    except GeneratorExit:
+        # توقف القائد مبكرًا: يُكمل خيط خلفي التدفق إن كان هناك من ينتظره
+        with _streams_lock:
+            handoff = shared.followers > 0
+        if handoff:
+            threading.Thread(
+                target=_publish, args=(upstream, shared, key, cache), name="llm-stream", daemon=True
+            ).start()
+        else:
+            upstream.close()
+            _forget(key, shared)
+            shared.finish(RuntimeError("توقف التدفق"))
+        raise
+    except Exception as e:
+        _forget(key, shared)
+        shared.finish(e)
+        raise
+    else:
+        _publish(iter(()), shared, key, cache)
+
+
+def collapse_blank_lines(chunks):
+    """
+    مكافئ تدفقي لـ text.replace("\n\n", "\n"): يُحتفظ بسطر جديد معلّق
+    حتى نعرف هل يكمله سطر جديد في الجزء التالي أم لا.
+    """
+    pending = False
+    for chunk in chunks:
+        out = []
+        for char in chunk:
+            if char == "\n":
+                if pending:
+                    out.append("\n")
+                pending = not pending
+            else:
+                if pending:
+                    out.append("\n")
+                    pending = False
+                out.append(char)
+        if out:
+            yield "".join(out)
+    if pending:
+        yield "\n"
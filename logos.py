@@ -0,0 +1,80 @@
+import glob
+import hashlib
+import os
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+from cache import SingleFlight
+from clients import get_openai
+
+##############################
+# إعدادات توليد الشعارات الافتراضية
+##############################
+DEFAULT_IMAGE_DIR = "images"
+DEFAULT_IMAGE_SIZE = "512x512"
+DEFAULT_VARIANTS = 4            # عدد النسخ المولدة لكل طلب
+DEFAULT_WORKERS = 8             # عدد الخيوط لتحميل الصور بالتوازي
+DOWNLOAD_CHUNK_SIZE = 64 * 1024
+DOWNLOAD_TIMEOUT = 30
+
+
+def prompt_hash(prompt, size=DEFAULT_IMAGE_SIZE):
+    """بصمة الطلب التي تُخزَّن تحتها صور الشعار"""
+    return hashlib.sha256(f"{size}\n{prompt}".encode("utf-8")).hexdigest()[:32]
+
+
+class LogoGenerator:
+    """
+    توليد نسخ متعددة من الشعار عبر DALL-E، مع تحميل الصور بالتوازي
+    مباشرة إلى القرص وتخزينها تحت بصمة الطلب لإعادة استخدامها.
+    """
+
+    def __init__(self, directory=DEFAULT_IMAGE_DIR, size=DEFAULT_IMAGE_SIZE,
+                 max_workers=DEFAULT_WORKERS):
+        self.directory = directory
+        self.size = size
+        self._downloads = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="logo-download")
+        import requests  # استيراد متأخر حتى لا يتحمله بدء التشغيل
+        self._http = requests.Session()
+        self._flight = SingleFlight()
+        os.makedirs(directory, exist_ok=True)
+
+    def cached(self, prompt, n=DEFAULT_VARIANTS):
+        """مسارات الصور المخزنة لهذا الطلب إن وُجد منها n على الأقل"""
+        pattern = os.path.join(self.directory, f"{prompt_hash(prompt, self.size)}-*.png")
+        paths = sorted(glob.glob(pattern))
+        return paths[:n] if len(paths) >= n else None
+
+    def generate(self, prompt, n=DEFAULT_VARIANTS):
+        """توليد n نسخة للطلب (أو إرجاعها من القرص) وانتظار اكتمالها"""
+        paths = self.cached(prompt, n)
+        if paths is not None:
+            return paths
+        key = (prompt_hash(prompt, self.size), n)
+        return self._flight.do(key, lambda: self.cached(prompt, n) or self._generate(prompt, n))
+
+    def _generate(self, prompt, n):
+        response = get_openai().Image.create(prompt=prompt, n=n, size=self.size)
+        digest = prompt_hash(prompt, self.size)
+        downloads = [
+            self._downloads.submit(
+                self._download, item["url"], os.path.join(self.directory, f"{digest}-{i}.png")
+            )
+            for i, item in enumerate(response["data"])
+        ]
+        return [download.result() for download in downloads]
+
+    def _download(self, url, path):
+        # التحميل إلى ملف مؤقت ثم نقله حتى لا يرى أحد صورة نصف مكتملة
+        with self._http.get(url, stream=True, timeout=DOWNLOAD_TIMEOUT) as response:
+            response.raise_for_status()
+            fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".part")
+            try:
+                with os.fdopen(fd, "wb") as file:
+                    for chunk in response.iter_content(DOWNLOAD_CHUNK_SIZE):
+                        file.write(chunk)
+                os.replace(tmp_path, path)
+            except BaseException:
+                os.unlink(tmp_path)
+                raise
+        return path
@@ -0,0 +1,197 @@
+import json
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from functools import wraps
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+##############################
+# إعدادات القياس الافتراضية
+##############################
+PREFIX = "sawq_"
+DEFAULT_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)  # حدود المدرج بالثواني
+DEFAULT_WINDOW = 2048          # عدد آخر العينات المحفوظة لحساب المئينات
+DEFAULT_HOST = "127.0.0.1"     # /metrics بلا مصادقة: محلي افتراضيًا (METRICS_HOST لتغييره)
+PERCENTILES = (50, 95, 99)
+
+
+def _labels_key(labels):
+    return tuple(sorted(labels.items()))
+
+
+def _format_labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{key}="{value}"' for key, value in pairs) + "}"
+
+
+class Histogram:
+    """مدرج تراكمي بأسلوب Prometheus مع نافذة لآخر العينات لحساب p50/p95/p99"""
+
+    def __init__(self, buckets=DEFAULT_BUCKETS, window=DEFAULT_WINDOW):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+        self.samples = deque(maxlen=window)
+
+    def observe(self, value):
+        self.count += 1
+        self.sum += value
+        self.samples.append(value)
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+
+    def percentile(self, p):
+        if not self.samples:
+            return None
+        ordered = sorted(self.samples)
+        index = min(len(ordered) - 1, max(0, round(p / 100 * len(ordered)) - 1))
+        return ordered[index]
+
+
+class Metrics:
+    """
+    سجل القياسات داخل العملية: أزمنة المراحل (مدرجات) وعدادات (توكنات، أخطاء)،
+    مع مصادر تُستدعى عند التصدير لقراءة قيم آنية مثل نسب إصابة الذاكرة المؤقتة.
+    """
+
+    def __init__(self):
+        self._histograms = {}
+        self._counters = {}
+        self._collectors = {}
+        self._lock = threading.Lock()
+
+    def observe(self, name, value, **labels):
+        key = (name, _labels_key(labels))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram()
+            histogram.observe(value)
+
+    def increment(self, name, amount=1, **labels):
+        key = (name, _labels_key(labels))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    @contextmanager
+    def timer(self, stage):
+        """قياس زمن مرحلة وعدّ أخطائها"""
+        start = time.perf_counter()
+        try:
+            yield
+        except BaseException:
+            self.increment("errors_total", stage=stage)
+            raise
+        finally:
+            self.observe("stage_seconds", time.perf_counter() - start, stage=stage)
+
+    def timed(self, stage):
+        """مزخرف يقيس زمن الدالة كمرحلة باسم stage"""
+        def decorator(fn):
+            @wraps(fn)
+            def wrapper(*args, **kwargs):
+                with self.timer(stage):
+                    return fn(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def register_collector(self, name, collect):
+        """collect() تُرجع قاموس قيم رقمية تُصدَّر كمقاييس آنية باسم name"""
+        self._collectors[name] = collect
+
+    def _gauges(self):
+        gauges = {}
+        for name, collect in list(self._collectors.items()):
+            try:
+                values = collect()
+            except Exception:
+                continue  # مصدر غير متاح بعد (مثل عميل لم يُنشأ)
+            for key, value in values.items():
+                if isinstance(value, (int, float)):
+                    gauges[f"{name}_{key}"] = value
+        return gauges
+
+    def snapshot(self):
+        """كل القياسات في قاموس قابل للتحويل إلى JSON"""
+        with self._lock:
+            histograms = [
+                {
+                    "name": name, "labels": dict(labels), "count": h.count, "sum": h.sum,
+                    **{f"p{p}": h.percentile(p) for p in PERCENTILES},
+                }
+                for (name, labels), h in sorted(self._histograms.items())
+            ]
+            counters = [
+                {"name": name, "labels": dict(labels), "value": value}
+                for (name, labels), value in sorted(self._counters.items())
+            ]
+        return {"histograms": histograms, "counters": counters, "gauges": self._gauges()}
+
+    def to_json(self):
+        return json.dumps(self.snapshot(), ensure_ascii=False, indent=2)
+
+    def to_prometheus(self):
+        """التصدير بصيغة Prometheus النصية"""
+        lines = []
+        with self._lock:
+            histograms = sorted(self._histograms.items())
+            counters = sorted(self._counters.items())
+        for name in sorted({name for (name, _), _ in histograms}):
+            lines.append(f"# TYPE {PREFIX}{name} histogram")
+            for (series, labels), h in histograms:
+                if series != name:
+                    continue
+                for bound, count in zip(h.buckets, h.counts):
+                    lines.append(f"{PREFIX}{name}_bucket{_format_labels(labels, [('le', bound)])} {count}")
+                lines.append(f"{PREFIX}{name}_bucket{_format_labels(labels, [('le', '+Inf')])} {h.count}")
+                lines.append(f"{PREFIX}{name}_sum{_format_labels(labels)} {h.sum}")
+                lines.append(f"{PREFIX}{name}_count{_format_labels(labels)} {h.count}")
+        for name in sorted({name for (name, _), _ in counters}):
+            lines.append(f"# TYPE {PREFIX}{name} counter")
+            for (series, labels), value in counters:
+                if series == name:
+                    lines.append(f"{PREFIX}{name}{_format_labels(labels)} {value}")
+        for name, value in sorted(self._gauges().items()):
+            lines.append(f"# TYPE {PREFIX}{name} gauge")
+            lines.append(f"{PREFIX}{name} {value}")
+        return "\n".join(lines) + "\n"
+
+    def reset(self):
+        with self._lock:
+            self._histograms.clear()
+            self._counters.clear()
+
+
+def serve(registry, port, host=DEFAULT_HOST):
+    """تشغيل خادم HTTP في الخلفية يعرض /metrics (Prometheus) و /metrics.json"""
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path == "/metrics":
+                body, content_type = registry.to_prometheus(), "text/plain; version=0.0.4"
+            elif self.path == "/metrics.json":
+                body, content_type = registry.to_json(), "application/json"
+            else:
+                self.send_error(404)
+                return
+            payload = body.encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", f"{content_type}; charset=utf-8")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+    return server
+
+
+# السجل المشترك لكل العملية
+metrics = Metrics()
@@ -0,0 +1,395 @@
+import logging
+import queue
+import random
+import threading
+import time
+
+from context_builder import estimate_tokens
+from llm import DEFAULT_MODEL, CachedPrompt, record_usage
+from metrics import metrics
+
+##############################
+# إعدادات توجيه طلبات النماذج الافتراضية
+##############################
+OPENAI_MODEL = "gpt-4o-mini"
+ANTHROPIC_FIRST_TOKEN_SLO = 2.0   # أقصى زمن مقبول لأول توكن من Claude قبل إرسال طلب احتياطي
+OPENAI_FIRST_TOKEN_SLO = 3.0
+DEFAULT_REQUEST_TIMEOUT = 60      # مهلة الطلب الواحد بالثواني
+DEFAULT_RETRIES = 2               # عدد الجولات الإضافية على كل المزودين بعد فشل الجولة الأولى
+DEFAULT_BACKOFF = 0.5             # أساس الانتظار بين الجولات (يتضاعف مع كل جولة)
+DEFAULT_MAX_BACKOFF = 4.0
+DEFAULT_MAX_IN_FLIGHT = 2         # الطلب الأصلي + طلب احتياطي واحد على الأكثر
+DEFAULT_FAILURE_THRESHOLD = 5     # أخطاء متتالية تفتح قاطع الدائرة
+DEFAULT_RESET_TIMEOUT = 30        # مدة بقاء القاطع مفتوحًا قبل تجربة المزود من جديد
+MIN_CACHE_TOKENS = 1024           # أقصر بادئة يقبل Claude Sonnet تخزينها (Haiku: 2048)
+
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+# أخطاء HTTP المؤقتة التي تستحق إعادة المحاولة (إضافة إلى كل 5xx ومنها 529)
+RETRYABLE_STATUS = (408, 409, 429)
+RETRYABLE_ERROR_TYPES = ("overloaded_error", "rate_limit_error", "api_error", "timeout_error")
+# أخطاء إعداد المزود نفسه (مفتاح ملغى، صلاحيات، نموذج غير متاح): تُحسب عليه ويُنتقل إلى غيره
+PROVIDER_STATUS = (401, 403, 404)
+PROVIDER_ERROR_TYPES = ("authentication_error", "permission_error", "not_found_error")
+
+logger = logging.getLogger(__name__)
+
+
+class RouterError(Exception):
+    """فشل كل المزودين؛ الأخطاء الأصلية في errors"""
+
+    def __init__(self, message, errors=()):
+        super().__init__(message)
+        self.errors = list(errors)
+
+    def __str__(self):
+        message = super().__str__()
+        return f"{message} ({'; '.join(self.errors)})" if self.errors else message
+
+
+def _error_type(error):
+    """نوع الخطأ الوارد داخل تدفق SSE بعد رد 200، إن وُجد"""
+    body = getattr(error, "body", None)
+    if isinstance(body, dict):
+        details = body.get("error", body)
+        if isinstance(details, dict):
+            return details.get("type")
+    return None
+
+
+def retryable(error):
+    """
+    هل الخطأ مؤقت من جهة المزود (ازدحام، خطأ خادم، مهلة، انقطاع اتصال)؟
+    أخطاء الطلب نفسه مثل 400 و 413 و 422 لا تُعاد ولا تُحسب على المزود، وأخطاء إعداد
+    المزود (انظر provider_failure) يُنتقل فيها إلى مزود آخر.
+    """
+    status = getattr(error, "status_code", None) or getattr(error, "http_status", None)
+    if status is not None and (status in RETRYABLE_STATUS or status >= 500):
+        return True
+    if _error_type(error) in RETRYABLE_ERROR_TYPES:
+        return True
+    if isinstance(error, (TimeoutError, ConnectionError)):
+        return True
+    import anthropic
+    import openai.error
+    return isinstance(error, (
+        anthropic.APIConnectionError,  # يشمل APITimeoutError
+        openai.error.Timeout, openai.error.APIConnectionError,
+        openai.error.ServiceUnavailableError, openai.error.TryAgain,
+    ))
+
+
+def provider_failure(error):
+    """
+    هل الخطأ من إعداد المزود لا من الطلب (401 و 403 و 404)؟ لا تفيد إعادته على المزود
+    نفسه، لكن مزودًا آخر قد ينجح، وهذا بالضبط ما وُجد الموجّه من أجله.
+    """
+    status = getattr(error, "status_code", None) or getattr(error, "http_status", None)
+    if status in PROVIDER_STATUS or _error_type(error) in PROVIDER_ERROR_TYPES:
+        return True
+    import anthropic
+    import openai.error
+    return isinstance(error, (
+        anthropic.AuthenticationError, anthropic.PermissionDeniedError, anthropic.NotFoundError,
+        openai.error.AuthenticationError, openai.error.PermissionError,
+    ))
+
+
+class CircuitBreaker:
+    """
+    قاطع دائرة لكل مزود: يُفتح بعد عدد من الأخطاء المتتالية فيُتخطى المزود،
+    ثم يسمح بطلب تجريبي واحد بعد reset_timeout ويُغلق إذا نجح.
+    """
+
+    def __init__(self, failure_threshold=DEFAULT_FAILURE_THRESHOLD, reset_timeout=DEFAULT_RESET_TIMEOUT):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = None
+        self._lock = threading.Lock()
+
+    def allow(self):
+        with self._lock:
+            if self.state == CLOSED:
+                return True
+            if self.state == OPEN and time.monotonic() - self.opened_at >= self.reset_timeout:
+                self.state = HALF_OPEN
+                return True
+            return False  # مفتوح، أو طلب تجريبي قيد التنفيذ
+
+    def record_success(self):
+        with self._lock:
+            self.state = CLOSED
+            self.failures = 0
+
+    def release(self):
+        """الطلب التجريبي أُلغي دون نتيجة: يُسمح بطلب تجريبي آخر"""
+        with self._lock:
+            if self.state == HALF_OPEN:
+                self.state = OPEN
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+                self.state = OPEN
+                self.opened_at = time.monotonic()
+
+
+def prefix_cacheable(prefix, min_tokens=MIN_CACHE_TOKENS):
+    """هل البادئة طويلة بما يكفي ليخزنها المزود (بتقدير محلي لعدد التوكنات)"""
+    return estimate_tokens(prefix) >= min_tokens
+
+
+class AnthropicProvider:
+    def __init__(self, get_client, model=DEFAULT_MODEL, first_token_slo=ANTHROPIC_FIRST_TOKEN_SLO,
+                 timeout=DEFAULT_REQUEST_TIMEOUT, min_cache_tokens=MIN_CACHE_TOKENS):
+        self.name = "anthropic"
+        self.model = model
+        self.first_token_slo = first_token_slo
+        self.timeout = timeout
+        self.min_cache_tokens = min_cache_tokens
+        self._get_client = get_client
+        self._client = None
+
+    def content(self, prompt):
+        """محتوى رسالة المستخدم؛ البادئة الثابتة كتلة مستقلة عليها نقطة تخزين"""
+        if not isinstance(prompt, CachedPrompt):
+            return prompt
+        prefix = {"type": "text", "text": prompt.prefix}
+        if prefix_cacheable(prompt.prefix, self.min_cache_tokens):
+            prefix["cache_control"] = {"type": "ephemeral"}
+            metrics.increment("llm_prompt_cache_total", provider=self.name, outcome="marked")
+        else:
+            # البادئة أقصر من الحد: يتجاهل المزود نقطة التخزين، فنرسلها كنص عادي
+            metrics.increment("llm_prompt_cache_total", provider=self.name, outcome="too_short")
+        return [prefix, {"type": "text", "text": prompt.suffix}]
+
+    def stream(self, prompt, max_tokens, cancelled):
+        """أجزاء النص أولًا بأول؛ تتوقف عند ضبط cancelled"""
+        if self._client is None:
+            # إعادة المحاولة يتولاها الموجّه حتى يستطيع الانتقال إلى مزود آخر
+            self._client = self._get_client().with_options(max_retries=0)
+        with self._client.messages.stream(
+            model=self.model,
+            max_tokens=max_tokens,
+            messages=[{"role": "user", "content": self.content(prompt)}],
+            timeout=self.timeout,
+        ) as stream:
+            for text in stream.text_stream:
+                if cancelled.is_set():
+                    return
+                if text:
+                    yield text
+            record_usage(self.model, stream.get_final_message().usage)
+
+
+class OpenAIProvider:
+    def __init__(self, get_openai, model=OPENAI_MODEL, first_token_slo=OPENAI_FIRST_TOKEN_SLO,
+                 timeout=DEFAULT_REQUEST_TIMEOUT):
+        self.name = "openai"
+        self.model = model
+        self.first_token_slo = first_token_slo
+        self.timeout = timeout
+        self._get_openai = get_openai
+
+    def stream(self, prompt, max_tokens, cancelled):
+        chunks = self._get_openai().ChatCompletion.create(
+            model=self.model,
+            max_tokens=max_tokens,
+            # OpenAI يخزن البادئات المتكررة تلقائيًا ما دامت في بداية الطلب
+            messages=[{"role": "user", "content": str(prompt)}],
+            stream=True,
+            request_timeout=self.timeout,
+        )
+        try:
+            for chunk in chunks:
+                if cancelled.is_set():
+                    return
+                text = chunk["choices"][0]["delta"].get("content") if chunk["choices"] else None
+                if text:
+                    yield text
+        finally:
+            chunks.close()
+
+
+class _Attempt:
+    """طلب واحد إلى مزود في خيطه الخاص، يضع أحداثه في طابور الموجّه"""
+
+    def __init__(self, provider, prompt, max_tokens, events):
+        self.provider = provider
+        self.started = time.perf_counter()
+        self.cancelled = threading.Event()
+        self._args = (prompt, max_tokens)
+        self._events = events
+        threading.Thread(target=self._run, name=f"llm-{provider.name}", daemon=True).start()
+
+    def _run(self):
+        try:
+            for text in self.provider.stream(*self._args, self.cancelled):
+                self._events.put((self, "token", text))
+            self._events.put((self, "done", None))
+        except Exception as e:
+            self._events.put((self, "error", e))
+
+
+class LLMRouter:
+    """
+    توجيه طلبات التوليد بين عدة مزودين بالترتيب مع:
+    - طلب احتياطي (hedging) إلى المزود التالي إذا تأخر أول توكن عن SLO المزود،
+      ويُعتمد أول من يرد ويُلغى الآخر؛
+    - إعادة المحاولة بانتظار متزايد بين الجولات؛
+    - قاطع دائرة لكل مزود يتخطاه بعد أخطاء متتالية.
+    """
+
+    def __init__(self, providers, retries=DEFAULT_RETRIES, backoff=DEFAULT_BACKOFF,
+                 max_backoff=DEFAULT_MAX_BACKOFF, max_in_flight=DEFAULT_MAX_IN_FLIGHT):
+        if not providers:
+            raise ValueError("لا يوجد مزود نماذج مضبوط")
+        self.providers = list(providers)
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.max_in_flight = max_in_flight
+        self.breakers = {provider.name: CircuitBreaker() for provider in self.providers}
+        # يُستدعى قبل كل محاولة فعلية (الأصلية والاحتياطية وإعادة المحاولة) بـ (prompt, max_tokens)،
+        # مثل حد المعدل في batch.py؛ إذا رفع خطأً يُلغى الطلب كله
+        self.before_attempt = None
+
+    @property
+    def model(self):
+        """النموذج الأساسي (يُستخدم في مفاتيح الذاكرة المؤقتة والسجلات)"""
+        return self.providers[0].model
+
+    def _plan(self):
+        """ترتيب المحاولات: كل المزودين في كل جولة، مع رقم الجولة"""
+        for round_index in range(self.retries + 1):
+            for provider in self.providers:
+                yield round_index, provider
+
+    def _backoff(self, round_index):
+        delay = min(self.max_backoff, self.backoff * 2 ** (round_index - 1))
+        return delay * random.uniform(0.5, 1)  # تشتيت حتى لا تعود كل الطلبات معًا
+
+    def stream(self, prompt, max_tokens=1024):
+        """أجزاء النص من أول مزود يبدأ الرد؛ يرفع RouterError إذا فشل الجميع"""
+        events = queue.Queue()
+        plan = self._plan()
+        active = []
+        errors = []
+        state = {"round": 0, "hedge_at": None, "fatal": None}
+        broken = set()  # مزودون فشل إعدادهم في هذا الطلب فلا يُعاد إليهم
+
+        def launch():
+            if state["fatal"] is not None:
+                return None  # خطأ غير مؤقت: لا محاولات جديدة
+            for round_index, provider in plan:
+                if provider.name in broken:
+                    continue
+                if not self.breakers[provider.name].allow():
+                    metrics.increment("llm_attempts_total", provider=provider.name, outcome="skipped")
+                    continue
+                if round_index > state["round"] and not active:
+                    time.sleep(self._backoff(round_index))
+                state["round"] = round_index
+                if self.before_attempt is not None:
+                    try:
+                        self.before_attempt(prompt, max_tokens)
+                    except BaseException:
+                        self.breakers[provider.name].release()
+                        raise
+                attempt = _Attempt(provider, prompt, max_tokens, events)
+                active.append(attempt)
+                state["hedge_at"] = time.monotonic() + provider.first_token_slo
+                return attempt
+            state["hedge_at"] = None
+            return None
+
+        def finish(attempt, outcome):
+            elapsed = time.perf_counter() - attempt.started
+            metrics.increment("llm_attempts_total", provider=attempt.provider.name, outcome=outcome)
+            metrics.observe("llm_attempt_seconds", elapsed, provider=attempt.provider.name)
+
+        winner = None
+        try:
+            launch()
+            while winner is None:
+                if not active:
+                    if state["fatal"] is not None:
+                        raise RouterError("رفض مزود النماذج الطلب.", errors) from state["fatal"]
+                    raise RouterError("كل مزودي النماذج غير متاحين حاليًا، حاول مرة أخرى بعد قليل.", errors)
+                hedge_at = state["hedge_at"]
+                timeout = max(0, hedge_at - time.monotonic()) if hedge_at is not None else None
+                try:
+                    attempt, kind, value = events.get(timeout=timeout)
+                except queue.Empty:
+                    # تأخر أول توكن عن SLO آخر طلب: نرسل طلبًا احتياطيًا إلى المزود التالي
+                    metrics.increment("llm_slo_miss_total", provider=active[-1].provider.name)
+                    if len(active) < self.max_in_flight and launch() is not None:
+                        metrics.increment("llm_hedges_total", provider=active[-1].provider.name)
+                    else:
+                        state["hedge_at"] = None
+                    continue
+                if attempt not in active:
+                    continue
+                if kind == "error":
+                    active.remove(attempt)
+                    errors.append(attempt.provider.name + ": " + repr(value))
+                    finish(attempt, "error")
+                    if retryable(value):
+                        self.breakers[attempt.provider.name].record_failure()
+                        logger.warning("llm %s failed: %r", attempt.provider.name, value)
+                    elif provider_failure(value):
+                        self.breakers[attempt.provider.name].record_failure()
+                        broken.add(attempt.provider.name)
+                        logger.error("llm %s unavailable: %r", attempt.provider.name, value)
+                    else:
+                        # خطأ في الطلب نفسه: يُرفع فورًا (أو بعد الطلب الاحتياطي الجاري) دون المساس بالقاطع
+                        self.breakers[attempt.provider.name].release()
+                        state["fatal"] = value
+                        logger.error("llm %s rejected the request: %r", attempt.provider.name, value)
+                    if not active:
+                        launch()
+                    continue
+                winner = attempt  # أول توكن، أو رد فارغ اكتمل
+        except BaseException:
+            # خطأ من before_attempt أو توقف المستدعي: لا نترك طلبات تعمل بلا مستهلك
+            for attempt in active:
+                attempt.cancelled.set()
+                self.breakers[attempt.provider.name].release()
+            raise
+
+        for attempt in active:
+            if attempt is not winner:
+                attempt.cancelled.set()
+                self.breakers[attempt.provider.name].release()
+                finish(attempt, "cancelled")
+        metrics.observe("llm_first_token_seconds", time.perf_counter() - winner.started,
+                        provider=winner.provider.name)
+
+        try:
+            while kind == "token":
+                yield value
+                attempt, kind, value = events.get()
+                while attempt is not winner:
+                    attempt, kind, value = events.get()
+        finally:
+            winner.cancelled.set()  # المستهلك توقف مبكرًا
+        if kind == "error":
+            # بعد ظهور جزء من النص لا يمكن التبديل إلى مزود آخر دون تكرار الكلام
+            if retryable(value) or provider_failure(value):
+                self.breakers[winner.provider.name].record_failure()
+            else:
+                self.breakers[winner.provider.name].release()
+            finish(winner, "error")
+            raise RouterError("انقطع التوليد قبل اكتماله، حاول مرة أخرى.", [repr(value)]) from value
+        self.breakers[winner.provider.name].record_success()
+        finish(winner, "success")
+
+    def complete(self, prompt, max_tokens=1024):
+        return "".join(self.stream(prompt, max_tokens))
+
+    def stats(self):
+        """حالة قواطع الدائرة: 0 مغلق، 1 نصف مفتوح، 2 مفتوح"""
+        codes = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+        return {f"{name}_breaker": codes[breaker.state] for name, breaker in self.breakers.items()}
@@ -0,0 +1,63 @@
+import re
+
+from cache import DEFAULT_MAX_ENTRIES, TTLCache
+
+DEFAULT_SEARCH_TTL = 6 * 60 * 60  # صلاحية نتائج البحث بالثواني
+
+# التشكيل العربي (الفتحة إلى السكون والألف الخنجرية) والتطويل
+_ARABIC_MARKS = re.compile("[\u064B-\u0652\u0670\u0640]")
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_query(query):
+    """توحيد نص البحث: إزالة التشكيل والتطويل وتوحيد المسافات وحالة الأحرف"""
+    query = _ARABIC_MARKS.sub("", query)
+    return _WHITESPACE.sub(" ", query).strip().casefold()
+
+
+class CachedSearch:
+    """
+    طبقة تخزين مؤقت أمام GoogleSearchAPIWrapper بنفس واجهة results،
+    تدمج الاستعلامات المتشابهة والمتزامنة في طلب واحد إلى جوجل.
+    """
+
+    def __init__(self, search, ttl=DEFAULT_SEARCH_TTL, max_entries=DEFAULT_MAX_ENTRIES):
+        self.search = search
+        self.cache = TTLCache(ttl=ttl, max_entries=max_entries)
+
+    def results(self, query, num_results, **kwargs):
+        key = (normalize_query(query), num_results, tuple(sorted(kwargs.items())))
+        results = self.cache.get_or_load(
+            key, lambda: self.search.results(query, num_results, **kwargs)
+        )
+        # نسخة لكل طالب حتى لا يعدّل أحدهم النتائج المخزنة
+        return [dict(result) for result in results]
+
+
+class CustomSearchClient:
+    """
+    عميل مباشر لواجهة Custom Search JSON بنفس صيغة نتائج GoogleSearchAPIWrapper،
+    يُستخدم عندما يُضبط GOOGLE_SEARCH_URL (خادم بديل أو محلي لاختبارات الحمل).
+    """
+
+    def __init__(self, base_url, api_key, cse_id, timeout=10):
+        self.url = base_url.rstrip("/") + "/customsearch/v1"
+        self.api_key = api_key
+        self.cse_id = cse_id
+        self.timeout = timeout
+        self._session = None
+
+    def results(self, query, num_results, **kwargs):
+        if self._session is None:
+            import requests
+            self._session = requests.Session()
+        params = {"key": self.api_key, "cx": self.cse_id, "q": query, "num": num_results, **kwargs}
+        response = self._session.get(self.url, params=params, timeout=self.timeout)
+        response.raise_for_status()
+        items = response.json().get("items", [])
+        if not items:
+            return [{"Result": "No good Google Search Result was found"}]
+        return [
+            {"title": item.get("title"), "link": item.get("link"), "snippet": item.get("snippet", "")}
+            for item in items
+        ]
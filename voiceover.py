@@ -0,0 +1,236 @@
+import glob
+import hashlib
+import io
+import os
+import re
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from cache import SingleFlight
+
+##############################
+# إعدادات التعليق الصوتي الافتراضية
+##############################
+DEFAULT_AUDIO_DIR = os.path.join("cache", "audio")
+DEFAULT_AUDIO_CACHE_BYTES = 256 * 1024 * 1024  # الحد الأقصى لحجم المقاطع المخزنة
+DEFAULT_LANGUAGE = "ar"
+DEFAULT_WORKERS = 4             # عدد المقاطع التي تُولَّد في نفس الوقت
+DEFAULT_MAX_CHUNK_CHARS = 400   # الجمل الأطول تُقسم عند الفواصل ثم المسافات
+DEFAULT_TIMEOUT = 30
+
+# نهاية الجملة: نقطة أو علامة استفهام/تعجب (عربية أو لاتينية) أو فاصلة منقوطة أو سطر جديد
+_SENTENCE_END = re.compile(r"(?<=[.!?؟؛])\s+|\n+")
+_CLAUSE_END = re.compile(r"(?<=[،,:])\s+")
+# رموز التنسيق التي لا تُنطق (Markdown والتعداد)
+_MARKUP = re.compile(r"[*#_`>|]+|^\s*(?:[-•]|\d+[.)])\s+", re.MULTILINE)
+
+
+def _split_long(sentence, max_chars):
+    parts = []
+    for piece in _CLAUSE_END.split(sentence):
+        while len(piece) > max_chars:
+            cut = piece.rfind(" ", 0, max_chars)
+            cut = cut if cut > 0 else max_chars
+            parts.append(piece[:cut].strip())
+            piece = piece[cut:].strip()
+        if piece:
+            parts.append(piece)
+    return parts
+
+
+def split_sentences(text, max_chars=DEFAULT_MAX_CHUNK_CHARS):
+    """
+    تقسيم النص إلى مقاطع عند حدود الجمل بعد إزالة رموز التنسيق. كل جملة مقطع مستقل
+    (دون دمج) حتى لا يغيّر تعديل جملة واحدة مقاطع ما بعدها فتبقى في الذاكرة المؤقتة.
+    """
+    chunks = []
+    for sentence in _SENTENCE_END.split(_MARKUP.sub(" ", text)):
+        sentence = " ".join(sentence.split())
+        if not any(char.isalnum() for char in sentence):
+            continue  # سطر فارغ أو رموز فقط
+        if len(sentence) > max_chars:
+            chunks.extend(_split_long(sentence, max_chars))
+        else:
+            chunks.append(sentence)
+    return chunks
+
+
+def chunk_key(text, language=DEFAULT_LANGUAGE):
+    """بصمة المقطع التي يُخزن تحتها صوته"""
+    return hashlib.sha256(f"{language}\n{text}".encode("utf-8")).hexdigest()[:32]
+
+
+def gtts_synthesize(text, language):
+    """توليد صوت المقطع عبر gTTS (MP3)"""
+    from gtts import gTTS  # استيراد متأخر حتى لا يتحمله بدء التشغيل
+
+    buffer = io.BytesIO()
+    gTTS(text, lang=language).write_to_fp(buffer)
+    return buffer.getvalue()
+
+
+class HTTPSynthesizer:
+    """
+    بديل لـ gTTS يرسل المقطع إلى خادم تحويل نص إلى كلام (POST {url}/synthesize)
+    ويستقبل MP3، يُستخدم عندما يُضبط TTS_URL (خادم محلي لاختبارات الحمل مثلًا).
+    """
+
+    def __init__(self, base_url, timeout=DEFAULT_TIMEOUT):
+        self.url = base_url.rstrip("/") + "/synthesize"
+        self.timeout = timeout
+        self._session = None
+
+    def __call__(self, text, language):
+        if self._session is None:
+            import requests
+            self._session = requests.Session()
+        response = self._session.post(
+            self.url, json={"text": text, "lang": language}, timeout=self.timeout
+        )
+        response.raise_for_status()
+        return response.content
+
+
+class AudioCache:
+    """
+    مقاطع الصوت على القرص بأسماء بصماتها، مع إزالة الأقدم استخدامًا (حسب وقت
+    التعديل الذي يُحدَّث عند كل إصابة) عندما يتجاوز الحجم max_bytes.
+    """
+
+    def __init__(self, directory=DEFAULT_AUDIO_DIR, max_bytes=DEFAULT_AUDIO_CACHE_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        self._size = sum(os.path.getsize(path) for path in self._files())
+
+    def _files(self):
+        return glob.glob(os.path.join(self.directory, "*.mp3"))
+
+    def path(self, key):
+        return os.path.join(self.directory, f"{key}.mp3")
+
+    def get(self, key):
+        """مسار المقطع المخزن أو None"""
+        path = self.path(key)
+        try:
+            os.utime(path)  # آخر استخدام
+        except FileNotFoundError:
+            with self._lock:
+                self.misses += 1
+            return None
+        with self._lock:
+            self.hits += 1
+        return path
+
+    def set(self, key, audio):
+        path = self.path(key)
+        # الكتابة إلى ملف مؤقت ثم نقله حتى لا يُقرأ مقطع نصف مكتمل
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".part")
+        try:
+            with os.fdopen(fd, "wb") as file:
+                file.write(audio)
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+        with self._lock:
+            self._size += len(audio)
+            if self._size > self.max_bytes:
+                self._evict(keep=path)
+        return path
+
+    def _evict(self, keep):
+        entries = []
+        for path in self._files():
+            try:
+                entries.append((os.path.getmtime(path), os.path.getsize(path), path))
+            except FileNotFoundError:
+                continue
+        self._size = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if self._size <= self.max_bytes:
+                break
+            if path == keep:
+                continue
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+            self._size -= size
+
+    def stats(self):
+        """عدادات الإصابة والإخفاق وحجم المخزن"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "entries": len(self._files()),
+                "bytes": self._size,
+            }
+
+
+class VoiceOver:
+    """
+    تعليق صوتي للنصوص الطويلة: تقسيم عند حدود الجمل، وتوليد المقاطع بالتوازي،
+    وإرجاعها بالترتيب فور جاهزية كل منها حتى يبدأ التشغيل قبل اكتمال الباقي.
+    """
+
+    def __init__(self, synthesize=gtts_synthesize, cache=None, language=DEFAULT_LANGUAGE,
+                 max_workers=DEFAULT_WORKERS, max_chunk_chars=DEFAULT_MAX_CHUNK_CHARS):
+        self.synthesize = synthesize
+        self.cache = cache if cache is not None else AudioCache()
+        self.language = language
+        self.max_chunk_chars = max_chunk_chars
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="voiceover")
+        self._flight = SingleFlight()
+
+    def chunk(self, text, language):
+        """مسار صوت مقطع واحد من الذاكرة أو بعد توليده"""
+        key = chunk_key(text, language)
+        path = self.cache.get(key)
+        if path is not None:
+            return path
+        path = self.cache.path(key)
+        return self._flight.do(
+            key, lambda: path if os.path.exists(path) else self.cache.set(key, self.synthesize(text, language))
+        )
+
+    def chunk_audio(self, text, language):
+        """
+        صوت مقطع واحد (bytes). يُقرأ الملف فور جاهزيته لأن الذاكرة المؤقتة قد تزيله
+        لاحقًا لصالح مقاطع أحدث؛ وإن أُزيل قبل قراءته يُولَّد مرة أخرى.
+        """
+        for _ in range(2):
+            try:
+                with open(self.chunk(text, language), "rb") as file:
+                    return file.read()
+            except FileNotFoundError:
+                continue
+        raise FileNotFoundError(f"أُزيل صوت المقطع قبل قراءته: {text[:40]}")
+
+    def stream(self, text, language=None, audio=False):
+        """
+        مقاطع النص بالترتيب، كلٌّ منها فور جاهزيته وجاهزية ما قبله: مساراتها،
+        أو صوتها نفسه (bytes) إذا كان audio=True.
+        """
+        language = language or self.language
+        chunk = self.chunk_audio if audio else self.chunk
+        futures = [
+            self._pool.submit(chunk, sentence, language)
+            for sentence in split_sentences(text, self.max_chunk_chars)
+        ]
+        try:
+            for future in futures:
+                yield future.result()
+        finally:
+            for future in futures:
+                future.cancel()  # المستهلك توقف مبكرًا أو فشل مقطع
+
+    def generate(self, text, language=None):
+        return list(self.stream(text, language))